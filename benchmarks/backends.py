@@ -0,0 +1,39 @@
+# -*- coding:utf8 -*-
+from __future__ import print_function
+import argparse, sys, timeit
+from dojo import dojo_compile
+from dojo.compiler import BACKENDS
+from dojo.backend import UnsupportedVersion
+from benchmarks.examples import examples, run_scripted
+
+def best_of(repeat, function):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+def compare(repeat):
+    rows = []
+    for name, source in examples():
+        outputs = {}
+        for backend in sorted(BACKENDS):
+            try:
+                compiled = dojo_compile(source, name, backend=backend)
+            except UnsupportedVersion as e:
+                print('skipping {}: {}'.format(backend, e), file=sys.stderr)
+                continue
+
+            outputs[backend] = run_scripted(compiled, name)
+            rows.append((name, backend,
+                         best_of(repeat, lambda: dojo_compile(source, name, backend=backend)),
+                         best_of(repeat, lambda: run_scripted(compiled, name))))
+
+        if len(set(outputs.values())) > 1:
+            raise AssertionError('backends disagree on {}'.format(name))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.backends')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per measurement (best is kept)')
+    args = parser.parse_args()
+
+    print('{:<18} {:<10} {:>12} {:>12}'.format('example', 'backend', 'compile ms', 'run ms'))
+    for name, backend, compile_time, run_time in compare(args.repeat):
+        print('{:<18} {:<10} {:>12.3f} {:>12.3f}'.format(name, backend, compile_time*1000, run_time*1000))
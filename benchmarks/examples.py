@@ -0,0 +1,34 @@
+# -*- coding:utf8 -*-
+import os, sys
+
+try:
+    from cStringIO import StringIO
+    from __builtin__ import raw_input as input
+except ImportError:
+    from io import StringIO
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+STDIN = {
+    'bhaskara.dojo': '1\n-3\n2\n',
+    'fibonacci.dojo': '22\n',
+    'grouping.dojo': 'a\na\nb\nc\nc\nc\n' * 200,
+    'primes.dojo': '20000\n',
+    'storederef.dojo': '',
+    'strhex.dojo': 'the quick brown fox jumps over the lazy dog\n',
+}
+
+def examples():
+    for name in sorted(os.listdir(EXAMPLES_DIR)):
+        if name.endswith('.dojo'):
+            with open(os.path.join(EXAMPLES_DIR, name)) as f:
+                yield name, f.read()
+
+def run_scripted(compiled, name):
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin, sys.stdout = StringIO(STDIN.get(name, '')), StringIO()
+    try:
+        compiled({'__builtins__': __builtins__, 'input': input})
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdin, sys.stdout = stdin, stdout
@@ -0,0 +1,40 @@
+# -*- coding:utf8 -*-
+
+def deep_nesting(depth):
+    expr = 'x'
+    for i in range(depth):
+        expr = '(if x > {0}: {1} else: x - {0})'.format(i, expr.replace('x', '(x + 1)', 1))
+    return 'x = 0\ny = {}\n'.format(expr)
+
+def long_pipeline(stages):
+    lines = ['import operator', 'xs = range(100)']
+    steps = ['map{/x=>x + 1}', 'filter{/x=>x % 7 != 0}', 'map{/x=>x * 2}', 'list', 'sorted']
+    pipeline = ' |> '.join(steps[i % len(steps)] for i in range(stages))
+    lines.append('ys = xs |> {} |> list'.format(pipeline))
+    return '\n'.join(lines) + '\n'
+
+def many_defs(count):
+    lines = []
+    for i in range(count):
+        lines.append('def f{0}(a, b): if a > b: a - {0} else: b + {0}'.format(i))
+    lines.append('total = 0')
+    for i in range(count):
+        lines.append('total = total + f{0}({0}, {1})'.format(i, count - i))
+    return '\n'.join(lines) + '\n'
+
+def huge_literal(size):
+    items = ', '.join(str(i) for i in range(size))
+    pairs = ', '.join("'k{0}': {0}".format(i) for i in range(size))
+    return 'xs = [{}]\nd = {{{}}}\n'.format(items, pairs)
+
+GENERATORS = {
+    'deep_nesting': (deep_nesting, 30),
+    'long_pipeline': (long_pipeline, 200),
+    'many_defs': (many_defs, 300),
+    'huge_literal': (huge_literal, 3000),
+}
+
+def synthetic(scale=1):
+    for name in sorted(GENERATORS):
+        generate, size = GENERATORS[name]
+        yield name, generate(max(1, int(size * scale)))
@@ -0,0 +1,30 @@
+# -*- coding:utf8 -*-
+from __future__ import print_function
+import argparse, timeit
+from dojo.incremental import IncrementalParser
+from benchmarks.generators import many_defs
+
+def timed(function, *args):
+    start = timeit.default_timer()
+    result = function(*args)
+    return result, timeit.default_timer() - start
+
+def edits(source, count):
+    call = source.index('total = total + f{0}('.format(count // 2))
+    arg = source.index('(', call) + 1
+    yield 'same line', arg, arg, '1'
+    yield 'new line', arg, arg, '\n'
+    yield 'new expression', call, call, 'answer = 42\n'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.incremental')
+    parser.add_argument('--defs', type=int, default=2000, help='functions in the generated source (two lines each)')
+    args = parser.parse_args()
+
+    source = many_defs(args.defs)
+    incremental, full = timed(IncrementalParser, source)
+    print('{:<16} {:>10} lines {:>10.3f} ms'.format('full parse', source.count('\n'), full * 1000))
+
+    for name, start, end, text in edits(source, args.defs):
+        _, seconds = timed(incremental.edit, start, end, text)
+        print('{:<16} {:>16} {:>10.3f} ms'.format(name, '', seconds * 1000))
@@ -0,0 +1,44 @@
+# -*- coding:utf8 -*-
+from __future__ import print_function
+import argparse, gc, sys
+from dojo.compiler import count_nodes
+from dojo.parser import Parser
+from benchmarks.generators import GENERATORS
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def source_of(megabytes):
+    parts, size, generators = [], 0, sorted(GENERATORS)
+    while size < megabytes * 1024 * 1024:
+        generate, default = GENERATORS[generators[len(parts) % len(generators)]]
+        parts.append(generate(default))
+        size += len(parts[-1])
+    return ''.join(parts)
+
+def measure(source):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        program = Parser(source).program()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return count_nodes(program), current, peak
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.memory')
+    parser.add_argument('--megabytes', type=float, default=0.25, help='size of the generated source')
+    args = parser.parse_args()
+
+    if tracemalloc is None:
+        sys.exit('tracemalloc is not available on this interpreter')
+
+    source = source_of(args.megabytes)
+    nodes, retained, peak = measure(source)
+    print('source     {:>12.1f} KiB'.format(len(source) / 1024.0))
+    print('nodes      {:>12}'.format(nodes))
+    print('retained   {:>12.1f} KiB  ({:.0f} bytes/node)'.format(retained / 1024.0, float(retained) / nodes))
+    print('peak       {:>12.1f} KiB'.format(peak / 1024.0))
@@ -0,0 +1,133 @@
+# -*- coding:utf8 -*-
+from __future__ import print_function
+import argparse, gc, json, platform, subprocess, sys, timeit
+from dojo.parser import Parser, SCANNER
+from dojo.optimizer import dojo_optimize
+from dojo.compiler import BACKENDS, DojoCallable
+from benchmarks.examples import examples, run_scripted
+from benchmarks.generators import synthetic
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+PHASES = ('scan', 'parse', 'optimize', 'emit', 'run')
+
+def scan(source):
+    pos, line, column, tokens = 0, 1, 1, 0
+    while True:
+        token = SCANNER.scan(source, pos, line, column)
+        if token is None or token.name == 'EOF':
+            return tokens
+        tokens += 1
+        pos += token.raw_len
+        line, column = token.line, token.column + len(token.image)
+
+def nothing():
+    pass
+
+def best_of(repeat, function, setup=nothing):
+    return min(timeit.repeat(function, setup=setup, number=1, repeat=repeat))
+
+def peak_allocation(function, setup=nothing):
+    if tracemalloc is None:
+        return None
+    setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def phases(name, source, optimize=0, backend='bytecode'):
+    fresh = {}
+    parse_fresh = lambda: fresh.update(program=Parser(source).program())
+    optimized = dojo_optimize(Parser(source).program(), optimize)
+    compiled = DojoCallable(BACKENDS[backend](optimized, name, optimize))
+
+    yield 'scan', nothing, lambda: scan(source)
+    yield 'parse', nothing, lambda: Parser(source).program()
+    yield 'optimize', parse_fresh, lambda: dojo_optimize(fresh['program'], optimize)
+    yield 'emit', nothing, lambda: BACKENDS[backend](optimized, name, optimize)
+    yield 'run', nothing, lambda: run_scripted(compiled, name)
+
+def measure(name, source, repeat, optimize=0, backend='bytecode'):
+    result = {'bytes': len(source)}
+    for phase, setup, function in phases(name, source, optimize, backend):
+        result[phase] = {
+            'seconds': best_of(repeat, function, setup),
+            'peak_bytes': peak_allocation(function, setup),
+        }
+    return result
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(repeat=5, scale=1, optimize=0, backend='bytecode', only=None):
+    benchmarks = [('synthetic/' + name, source) for name, source in synthetic(scale)]
+    benchmarks += [('examples/' + name, source) for name, source in examples()]
+
+    results = {}
+    for name, source in benchmarks:
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = measure(name.split('/', 1)[1], source, repeat, optimize, backend)
+
+    return {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'backend': backend,
+        'optimize': optimize,
+        'repeat': repeat,
+        'scale': scale,
+        'results': results,
+    }
+
+def report(suite, baseline=None, out=sys.stdout):
+    print('{:<28} {:<9} {:>12} {:>14} {:>9}'.format(
+        'benchmark', 'phase', 'ms', 'peak KiB', 'change'), file=out)
+    for name in sorted(suite['results']):
+        for phase in PHASES:
+            current = suite['results'][name][phase]
+            peak = current['peak_bytes']
+            change = ''
+            if baseline and name in baseline['results']:
+                before = baseline['results'][name][phase]['seconds']
+                if before > 0:
+                    change = '{:+.1f}%'.format((current['seconds'] / before - 1) * 100)
+            print('{:<28} {:<9} {:>12.3f} {:>14} {:>9}'.format(
+                name, phase, current['seconds'] * 1000,
+                '-' if peak is None else '{:.1f}'.format(peak / 1024.0), change), file=out)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    parser.add_argument('only', nargs='*', help='run only benchmarks whose name contains one of these')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per measurement (best is kept)')
+    parser.add_argument('--scale', type=float, default=1, help='multiply the size of the synthetic sources')
+    parser.add_argument('-O', dest='optimize', action='count', default=0,
+                        help='optimize the compiled code (repeat for higher levels, e.g. -OO)')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='bytecode')
+    parser.add_argument('--json', metavar='FILE', help='write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='show timing changes against a previous --json run')
+    args = parser.parse_args()
+
+    suite = run_suite(args.repeat, args.scale, args.optimize, args.backend, args.only)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report(suite, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(suite, f, indent=2, sort_keys=True)
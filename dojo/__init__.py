@@ -1,4 +1,4 @@
 from dojo.compiler import dojo_compile
 from dojo.scanner import InvalidSyntax, UnexpectedToken
 
-__all__ = ['scanner', 'parser', 'ast', 'codegen', 'compiler']
+__all__ = ['scanner', 'parser', 'ast', 'codegen', 'backend', 'astgen', 'compiler', 'cache', 'optimizer', 'runtime', 'profile', 'repl', 'incremental', 'build', 'importer']
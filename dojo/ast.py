@@ -35,7 +35,7 @@ class LexicalContext(object):
         return var
 
     def push(self, args):
-        ctx = LexicalContext(self)
+        ctx = self.__class__(self)
         for arg in args:
             ctx.ensure(arg, 'local')
         return ctx
@@ -43,7 +43,32 @@ class LexicalContext(object):
     def varnames(self, of_type):
         return [var.name for var in self.variables.values() if var.scope == of_type]
 
+class ModuleContext(LexicalContext):
+    def ensure(self, name, scope):
+        return super(ModuleContext, self).ensure(name, 'global')
+
+    def assign(self, name):
+        return self.variables.get(name) or self.ensure(name, 'global')
+
+    def push(self, args):
+        ctx = NestedModuleContext(self)
+        for arg in args:
+            ctx.ensure(arg, 'local')
+        return ctx
+
+class NestedModuleContext(LexicalContext):
+    def assign(self, name):
+        var = self.request(name)
+        root = self
+        while root.parent:
+            root = root.parent
+        if var.scope == 'global' and name in root.variables:
+            return var
+        return super(NestedModuleContext, self).assign(name)
+
 class Variable(object):
+    __slots__ = ('context', 'name', 'scope')
+
     def __init__(self, context, name, scope):
         self.context = context
         self.name = name
@@ -52,38 +77,116 @@ class Variable(object):
     def to_assignment(self):
         return self.context.assign(self.name)
 
-class Program(object):
+    def __eq__(self, other):
+        return type(self) is type(other) and (self.name, self.scope) == (other.name, other.scope)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Variable({!r}, {!r})'.format(self.name, self.scope)
+
+def nodes_in(value):
+    if isinstance(value, Node):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            for node in nodes_in(item):
+                yield node
+
+def left_chain(e):
+    chain = [e]
+    while type(getattr(chain[-1], 'lhs', None)) is type(e):
+        chain.append(chain[-1].lhs)
+    chain.reverse()
+    return chain
+
+class Node(object):
+    __slots__ = ()
+    child_fields = ()
+
+    def fields(self):
+        return [(field, getattr(self, field)) for field in self.__slots__]
+
+    def children(self):
+        for field in self.child_fields:
+            for node in nodes_in(getattr(self, field)):
+                yield node
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.fields() == other.fields()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(field, value) for field, value in self.fields()))
+
+class Program(Node):
+    __slots__ = ('line', 'body', 'cell', 'free')
+    child_fields = ('body',)
+
     def __init__(self, line, body, cell, free):
         self.line = line
         self.body = body
         self.cell = cell
         self.free = free
 
-class Block(object):
+class Block(Node):
+    __slots__ = ('line', 'exprs')
+    child_fields = ('exprs',)
+
     def __init__(self, line, exprs=[]):
         self.line = line
         self.exprs = exprs
 
 
-class Literal(object):
+class LineShift(Node):
+    __slots__ = ('line', 'delta', 'expr')
+    child_fields = ('expr',)
+
+    def __init__(self, line, delta, expr):
+        self.line = line
+        self.delta = delta
+        self.expr = expr
+
+
+class Literal(Node):
+    __slots__ = ('line', 'value')
+    child_fields = ()
+
     def __init__(self, line, value):
         self.line = line
         self.value = value
 
 
-class ListLiteral(object):
+class ListLiteral(Node):
+    __slots__ = ('line', 'exprs')
+    child_fields = ('exprs',)
+
     def __init__(self, line, exprs):
         self.line = line
         self.exprs = exprs
 
 
-class DictLiteral(object):
+class DictLiteral(Node):
+    __slots__ = ('line', 'items')
+    child_fields = ('items',)
+
     def __init__(self, line, items):
         self.line = line
         self.items = items
 
 
-class GetVariable(object):
+class GetVariable(Node):
+    __slots__ = ('line', 'var')
+    child_fields = ()
+
     def __init__(self, line, var):
         self.line = line
         self.var = var
@@ -91,14 +194,20 @@ class GetVariable(object):
     def to_assignment(self, expr):
         return SetVariable(self.line, self.var.to_assignment(), expr)
 
-class SetVariable(object):
+class SetVariable(Node):
+    __slots__ = ('line', 'var', 'expr')
+    child_fields = ('expr',)
+
     def __init__(self, line, var, expr):
         self.line = line
         self.var = var
         self.expr = expr
 
 
-class GetAttribute(object):
+class GetAttribute(Node):
+    __slots__ = ('line', 'target', 'name')
+    child_fields = ('target',)
+
     def __init__(self, line, target, name):
         self.line = line
         self.target = target
@@ -107,7 +216,10 @@ class GetAttribute(object):
     def to_assignment(self, expr):
         return SetAttribute(self.line, self.target, self.name, expr)
 
-class SetAttribute(object):
+class SetAttribute(Node):
+    __slots__ = ('line', 'target', 'name', 'value')
+    child_fields = ('target', 'value')
+
     def __init__(self, line, target, name, value):
         self.line = line
         self.target = target
@@ -115,7 +227,10 @@ class SetAttribute(object):
         self.value = value
 
 
-class GetSubscript(object):
+class GetSubscript(Node):
+    __slots__ = ('line', 'target', 'index')
+    child_fields = ('target', 'index')
+
     def __init__(self, line, target, index):
         self.line = line
         self.target = target
@@ -124,7 +239,10 @@ class GetSubscript(object):
     def to_assignment(self, expr):
         return SetSubscript(self.line, self.target, self.index, expr)
 
-class SetSubscript(object):
+class SetSubscript(Node):
+    __slots__ = ('line', 'target', 'index', 'expr')
+    child_fields = ('expr', 'target', 'index')
+
     def __init__(self, line, target, index, expr):
         self.line = line
         self.target = target
@@ -132,26 +250,38 @@ class SetSubscript(object):
         self.expr = expr
 
 
-class Slice(object):
+class Slice(Node):
+    __slots__ = ('line', 'start', 'end')
+    child_fields = ('start', 'end')
+
     def __init__(self, line, start, end):
         self.line = line
         self.start = start
         self.end = end
 
 
-class Return(object):
+class Return(Node):
+    __slots__ = ('line', 'expr')
+    child_fields = ('expr',)
+
     def __init__(self, line, expr):
         self.line = line
         self.expr = expr
 
 
-class Yield(object):
+class Yield(Node):
+    __slots__ = ('line', 'expr')
+    child_fields = ('expr',)
+
     def __init__(self, line, expr):
         self.line = line
         self.expr = expr
 
 
-class Call(object):
+class Call(Node):
+    __slots__ = ('line', 'method', 'args', 'kwargs')
+    child_fields = ('method', 'args', 'kwargs')
+
     def __init__(self, line, method, args, kwargs):
         self.line = line
         self.method = method
@@ -159,21 +289,30 @@ class Call(object):
         self.kwargs = kwargs
 
 
-class PipeForward(object):
+class PipeForward(Node):
+    __slots__ = ('line', 'arg', 'method')
+    child_fields = ('arg', 'method')
+
     def __init__(self, line, arg, method):
         self.line = line
         self.arg = arg
         self.method = method
 
 
-class Composition(object):
+class Composition(Node):
+    __slots__ = ('line', 'lhs', 'rhs')
+    child_fields = ('lhs', 'rhs')
+
     def __init__(self, line, lhs, rhs):
         self.line = line
         self.lhs = lhs
         self.rhs = rhs
 
 
-class PartialCall(object):
+class PartialCall(Node):
+    __slots__ = ('line', 'method', 'args', 'kwargs')
+    child_fields = ('method', 'args', 'kwargs')
+
     def __init__(self, line, method, args, kwargs):
         self.line = line
         self.method = method
@@ -181,7 +320,10 @@ class PartialCall(object):
         self.kwargs = kwargs
 
 
-class BinaryOp(object):
+class BinaryOp(Node):
+    __slots__ = ('line', 'op', 'lhs', 'rhs')
+    child_fields = ('lhs', 'rhs')
+
     def __init__(self, line, op, lhs, rhs):
         self.line = line
         self.op = op
@@ -189,7 +331,10 @@ class BinaryOp(object):
         self.rhs = rhs
 
 
-class CompareOp(object):
+class CompareOp(Node):
+    __slots__ = ('line', 'op', 'lhs', 'rhs')
+    child_fields = ('lhs', 'rhs')
+
     def __init__(self, line, op, lhs, rhs):
         self.line = line
         self.op = op
@@ -197,7 +342,10 @@ class CompareOp(object):
         self.rhs = rhs
 
 
-class BooleanOp(object):
+class BooleanOp(Node):
+    __slots__ = ('line', 'op', 'lhs', 'rhs')
+    child_fields = ('lhs', 'rhs')
+
     def __init__(self, line, op, lhs, rhs):
         self.line = line
         self.op = op
@@ -205,14 +353,20 @@ class BooleanOp(object):
         self.rhs = rhs
 
 
-class UnaryOp(object):
+class UnaryOp(Node):
+    __slots__ = ('line', 'op', 'expr')
+    child_fields = ('expr',)
+
     def __init__(self, line, op, expr):
         self.line = line
         self.op = op
         self.expr = expr
 
 
-class If(object):
+class If(Node):
+    __slots__ = ('line', 'test', 'then_body', 'else_body')
+    child_fields = ('test', 'then_body', 'else_body')
+
     def __init__(self, line, test, then_body, else_body):
         self.line = line
         self.test = test
@@ -220,17 +374,80 @@ class If(object):
         self.else_body = else_body
 
 
-class Function(object):
-    def __init__(self, line, name, args, body, cell, free):
+class For(Node):
+    __slots__ = ('line', 'var', 'iterable', 'body')
+    child_fields = ('iterable', 'body')
+
+    def __init__(self, line, var, iterable, body):
+        self.line = line
+        self.var = var
+        self.iterable = iterable
+        self.body = body
+
+
+class While(Node):
+    __slots__ = ('line', 'test', 'body')
+    child_fields = ('test', 'body')
+
+    def __init__(self, line, test, body):
+        self.line = line
+        self.test = test
+        self.body = body
+
+
+class Comprehension(Node):
+    __slots__ = ('line', 'kind', 'element', 'clauses')
+    child_fields = ('element', 'clauses')
+
+    def __init__(self, line, kind, element, clauses):
+        self.line = line
+        self.kind = kind
+        self.element = element
+        self.clauses = clauses
+
+
+class Function(Node):
+    __slots__ = ('line', 'name', 'args', 'body', 'cell', 'free', 'column')
+    child_fields = ('body',)
+
+    def __init__(self, line, name, args, body, cell, free, column=None):
         self.line = line
         self.name = name
         self.args = args
         self.body = body
         self.cell = cell
         self.free = free
+        self.column = column
 
+    @property
+    def codename(self):
+        return self.codename_at(self.line)
 
-class Import(object):
-    def __init__(self, line, items):
+    def codename_at(self, line):
+        return self.name or '<lambda@{}:{}>'.format(line, self.column)
+
+
+class Memoize(Node):
+    __slots__ = ('line', 'function', 'maxsize')
+    child_fields = ('function',)
+
+    def __init__(self, line, function, maxsize):
+        self.line = line
+        self.function = function
+        self.maxsize = maxsize
+
+
+class Import(Node):
+    __slots__ = ('line', 'items', 'cached')
+    child_fields = ()
+
+    def __init__(self, line, items, cached=False):
         self.line = line
         self.items = items
+        self.cached = cached
+
+    @staticmethod
+    def slot(module, names):
+        if names is None:
+            return '$import:' + module
+        return '$import:{}:{}'.format(module, ','.join(names))
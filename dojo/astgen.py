@@ -0,0 +1,519 @@
+# -*- coding:utf8 -*-
+from __future__ import absolute_import
+import ast, sys, types
+from dojo.ast import (Comprehension, For, Function, GetVariable, Import, Memoize, Program,
+                      SetAttribute, SetSubscript, SetVariable, left_chain)
+from dojo.backend import UnsupportedVersion
+from dojo.visitor import dispatch_table
+
+BINARY_OPS = {
+    '&': ast.BitAnd,
+    '|': ast.BitOr,
+    '^': ast.BitXor,
+    '<<': ast.LShift,
+    '>>': ast.RShift,
+    '+': ast.Add,
+    '-': ast.Sub,
+    '*': ast.Mult,
+    '/': ast.Div,
+    '//': ast.FloorDiv,
+    '**': ast.Pow,
+    '%': ast.Mod,
+}
+
+UNARY_OPS = {
+    '+': ast.UAdd,
+    '-': ast.USub,
+    'not': ast.Not,
+    '~': ast.Invert,
+}
+
+COMPARE_OPS = {
+    '==': ast.Eq,
+    '!=': ast.NotEq,
+    '<': ast.Lt,
+    '<=': ast.LtE,
+    '>': ast.Gt,
+    '>=': ast.GtE,
+    'in': ast.In,
+    'not in': ast.NotIn,
+}
+
+BOOLEAN_OPS = {
+    'and': ast.And,
+    'or': ast.Or,
+}
+
+CONSTANT_NAMES = {
+    'None': None,
+    'True': True,
+    'False': False,
+}
+
+MAX_NESTING = 100
+
+RUNTIME = {
+    'compose': ('dojo.codegen', 'COMPOSE'),
+    'partial': ('functools', 'partial'),
+    'memoize': ('dojo.runtime', 'memoize'),
+}
+
+def dojo_emit_ast(program, filename, optimize=0, tail_calls=False):
+    if sys.version_info < (3, 8):
+        raise UnsupportedVersion(sys.version_info[:2], 'ast')
+    if tail_calls:
+        raise ValueError('tail calls are only supported by the bytecode backend')
+
+    module = AstGenerator(program).module()
+    code = compile(module, filename, 'exec', dont_inherit=True)
+    return [const for const in code.co_consts if isinstance(const, types.CodeType)][0]
+
+SILENT_STATEMENTS = (Function, Import, Memoize, SetAttribute, SetSubscript, SetVariable)
+
+class Scope(object):
+    def __init__(self, parent):
+        self.parent = parent
+        self.globals = set()
+        self.bound = set()
+        self.declared_globals = set()
+        self.nonlocals = set()
+        self.temps = 0
+
+    def pyname(self, name):
+        return name + '$' if name in self.globals or name in CONSTANT_NAMES else name
+
+    def owner(self, name):
+        scope = self.parent
+        while scope and name not in scope.bound:
+            scope = scope.parent
+        return scope or self
+
+class AstGenerator(object):
+    def __init__(self, program):
+        self.program = program
+        self.scopes = {}
+        self.helpers = set()
+        self.scope = None
+        self.stmts = []
+        self.line_shift = 0
+        self.expressions = dispatch_table(AstGenerator, 'expr_')
+        self.statements = dispatch_table(AstGenerator, 'statement_', 'statement_value')
+        self.analyze(program)
+
+    def analyze(self, program):
+        todo = [(program, None)]
+        while todo:
+            e, scope = todo.pop()
+            if isinstance(e, (Program, Function)):
+                scope = self.scopes[id(e)] = Scope(scope)
+                scope.bound.update(getattr(e, 'args', ()))
+
+            if isinstance(e, (GetVariable, SetVariable, For)):
+                if e.var.scope == 'global':
+                    self.mark_global(scope, e.var.name)
+                elif e.var.scope != 'closure':
+                    scope.bound.add(e.var.name)
+
+            if isinstance(e, Comprehension):
+                scope.bound.update(var.name for var, iterable, tests in e.clauses)
+
+            if isinstance(e, Import):
+                for module, names in e.items:
+                    for name in (names if names is not None else [module]):
+                        self.mark_global(scope, name)
+
+            todo.extend((child, scope) for child in e.children())
+
+    def mark_global(self, scope, name):
+        while scope:
+            scope.globals.add(name)
+            scope = scope.parent
+
+    def at(self, node, line):
+        node.lineno = node.end_lineno = line + self.line_shift if line else 1
+        node.col_offset = node.end_col_offset = 0
+        return node
+
+    def temp(self):
+        self.scope.temps += 1
+        return '$t{}'.format(self.scope.temps)
+
+    def load(self, name):
+        return ast.Name(id=name, ctx=ast.Load())
+
+    def store(self, name):
+        return ast.Name(id=name, ctx=ast.Store())
+
+    def assign(self, line, name, value):
+        self.stmts.append(self.at(ast.Assign(targets=[self.store(name)], value=value), line))
+
+    def helper(self, name):
+        self.helpers.add(name)
+        return self.load('$' + name)
+
+    def pyname(self, var):
+        if var.scope == 'global':
+            return var.name
+        if var.scope == 'closure':
+            return self.scope.owner(var.name).pyname(var.name)
+        return self.scope.pyname(var.name)
+
+    def module(self):
+        root = self.function_def(self.scopes[id(self.program)], '<root>', [], self.program)
+        return ast.fix_missing_locations(ast.Module(body=[root], type_ignores=[]))
+
+    def capture(self, e):
+        outer, self.stmts = self.stmts, []
+        value = self.expr(e)
+        stmts, self.stmts = self.stmts, outer
+        return stmts, value
+
+    def reuse(self, value):
+        if isinstance(value, ast.Constant):
+            return ast.Constant(value=value.value)
+        return self.load(value.id)
+
+    def spill(self, line, value):
+        if self.is_trivial(value):
+            return value
+        name = self.temp()
+        self.assign(line, name, value)
+        return self.load(name)
+
+    def is_trivial(self, value):
+        return (isinstance(value, ast.Constant) or
+                isinstance(value, ast.Name) and value.id.startswith('$'))
+
+    def values(self, exprs):
+        result = []
+        for e in exprs:
+            stmts, value = self.capture(e)
+            if stmts:
+                result = [self.spill(e.line, previous) for previous in result]
+                self.stmts.extend(stmts)
+            result.append(value)
+        return result
+
+    def expr(self, e):
+        node = self.expressions[type(e)](self, e)
+        return node if hasattr(node, 'lineno') else self.at(node, e.line)
+
+    def statement(self, e):
+        self.statements[type(e)](self, e)
+
+    def statement_value(self, e):
+        value = self.expr(e)
+        if not self.is_trivial(value) and not isinstance(e, SILENT_STATEMENTS):
+            self.stmts.append(self.at(ast.Expr(value=value), e.line))
+
+    def statement_Block(self, e):
+        for expr in e.exprs:
+            self.statement(expr)
+
+    def statement_LineShift(self, e):
+        self.line_shift += e.delta
+        self.statement(e.expr)
+        self.line_shift -= e.delta
+
+    def statement_If(self, e):
+        test = self.expr(e.test)
+        then_body = self.block(e.then_body)
+        else_body = self.block(e.else_body)
+        self.stmts.append(self.at(ast.If(test=test, body=then_body, orelse=else_body), e.line))
+
+    def block(self, e):
+        outer, self.stmts = self.stmts, []
+        self.statement(e)
+        stmts, self.stmts = self.stmts, outer
+        return stmts or [self.at(ast.Pass(), e.line)]
+
+    def expr_Literal(self, e):
+        return ast.Constant(value=e.value)
+
+    def expr_LineShift(self, e):
+        self.line_shift += e.delta
+        value = self.expr(e.expr)
+        self.line_shift -= e.delta
+        return value
+
+    def expr_Block(self, e):
+        if not e.exprs:
+            return ast.Constant(value=None)
+        for expr in e.exprs[:-1]:
+            self.statement(expr)
+        return self.expr(e.exprs[-1])
+
+    def expr_ListLiteral(self, e):
+        return ast.List(elts=self.values(e.exprs), ctx=ast.Load())
+
+    def expr_DictLiteral(self, e):
+        items = self.values([x for item in e.items for x in item])
+        return ast.Dict(keys=items[0::2], values=items[1::2])
+
+    def expr_GetVariable(self, e):
+        if e.var.scope == 'global' and e.var.name in CONSTANT_NAMES:
+            return ast.Constant(value=CONSTANT_NAMES[e.var.name])
+        return self.load(self.pyname(e.var))
+
+    def target(self, var):
+        name = self.pyname(var)
+        if var.scope == 'closure':
+            self.scope.nonlocals.add(name)
+        elif var.scope == 'global':
+            if name in CONSTANT_NAMES:
+                raise ValueError("the ast backend cannot assign the global '{}'".format(name))
+            self.scope.declared_globals.add(name)
+        return name
+
+    def expr_SetVariable(self, e):
+        name = self.target(e.var)
+
+        function = e.expr.function if isinstance(e.expr, Memoize) else e.expr
+        if isinstance(function, Function) and function.name == e.var.name:
+            value = self.function(function, name)
+            if isinstance(e.expr, Memoize):
+                self.assign(e.line, name, self.memoize(e.expr, value))
+            return self.load(name)
+
+        self.assign(e.line, name, self.expr(e.expr))
+        return self.load(name)
+
+    def expr_GetAttribute(self, e):
+        return ast.Attribute(value=self.expr(e.target), attr=e.name, ctx=ast.Load())
+
+    def expr_SetAttribute(self, e):
+        value, target = self.values([e.value, e.target])
+        value = self.spill(e.line, value)
+        attribute = ast.Attribute(value=target, attr=e.name, ctx=ast.Store())
+        self.stmts.append(self.at(ast.Assign(targets=[attribute], value=value), e.line))
+        return self.reuse(value)
+
+    def subscript_index(self, index):
+        if sys.version_info < (3, 9) and not isinstance(index, ast.Slice):
+            return ast.Index(value=index)
+        return index
+
+    def expr_GetSubscript(self, e):
+        target, index = self.values([e.target, e.index])
+        return ast.Subscript(value=target, slice=self.subscript_index(index), ctx=ast.Load())
+
+    def expr_SetSubscript(self, e):
+        value, target, index = self.values([e.expr, e.target, e.index])
+        value = self.spill(e.line, value)
+        subscript = ast.Subscript(value=target, slice=self.subscript_index(index), ctx=ast.Store())
+        self.stmts.append(self.at(ast.Assign(targets=[subscript], value=value), e.line))
+        return self.reuse(value)
+
+    def expr_Slice(self, e):
+        lower, upper = self.values([e.start, e.end])
+        return ast.Slice(lower=lower, upper=upper, step=None)
+
+    def expr_Return(self, e):
+        self.stmts.append(self.at(ast.Return(value=self.expr(e.expr)), e.line))
+        return ast.Constant(value=None)
+
+    def expr_Yield(self, e):
+        return ast.Yield(value=self.expr(e.expr))
+
+    def call(self, method, args, kwargs):
+        values = self.values([method] + list(args) + [arg for key, arg in kwargs])
+        keywords = [ast.keyword(arg=key, value=value)
+                    for (key, arg), value in zip(kwargs, values[len(args)+1:])]
+        return ast.Call(func=values[0], args=values[1:len(args)+1], keywords=keywords)
+
+    def expr_Call(self, e):
+        return self.call(e.method, e.args, e.kwargs)
+
+    def expr_PipeForward(self, e):
+        return self.call(e.method, [e.arg], ())
+
+    def expr_PartialCall(self, e):
+        call = self.call(e.method, e.args, e.kwargs)
+        return ast.Call(func=self.helper('partial'), args=[call.func] + call.args, keywords=call.keywords)
+
+    def expr_Composition(self, e):
+        return ast.Call(func=self.helper('compose'), args=self.values([e.lhs, e.rhs]), keywords=[])
+
+    def chain(self, e, combine):
+        chain = left_chain(e)
+        value = self.expr(chain[0].lhs)
+        for depth, node in enumerate(chain, 1):
+            if depth % MAX_NESTING == 0:
+                value = self.spill(node.line, value)
+            value = self.at(combine(node, value), node.line)
+        return value
+
+    def operand(self, node, lhs):
+        stmts, rhs = self.capture(node.rhs)
+        if stmts:
+            lhs = self.spill(node.line, lhs)
+            self.stmts.extend(stmts)
+        return lhs, rhs
+
+    def expr_BinaryOp(self, e):
+        return self.chain(e, self.binary_op)
+
+    def binary_op(self, e, lhs):
+        lhs, rhs = self.operand(e, lhs)
+        return ast.BinOp(left=lhs, op=BINARY_OPS[e.op](), right=rhs)
+
+    def expr_CompareOp(self, e):
+        return self.chain(e, self.compare_op)
+
+    def compare_op(self, e, lhs):
+        lhs, rhs = self.operand(e, lhs)
+        return ast.Compare(left=lhs, ops=[COMPARE_OPS[e.op]()], comparators=[rhs])
+
+    def expr_UnaryOp(self, e):
+        return ast.UnaryOp(op=UNARY_OPS[e.op](), operand=self.expr(e.expr))
+
+    def expr_BooleanOp(self, e):
+        return self.chain(e, self.boolean_op)
+
+    def boolean_op(self, e, lhs):
+        stmts, rhs = self.capture(e.rhs)
+        if not stmts:
+            return ast.BoolOp(op=BOOLEAN_OPS[e.op](), values=[lhs, rhs])
+
+        name = self.temp()
+        self.assign(e.line, name, lhs)
+        test = self.load(name) if e.op == 'and' else ast.UnaryOp(op=ast.Not(), operand=self.load(name))
+        body = stmts + [self.at(ast.Assign(targets=[self.store(name)], value=rhs), e.line)]
+        self.stmts.append(self.at(ast.If(test=test, body=body, orelse=[]), e.line))
+        return self.load(name)
+
+    def expr_If(self, e):
+        test = self.expr(e.test)
+        then_stmts, then_value = self.capture(e.then_body)
+        else_stmts, else_value = self.capture(e.else_body)
+        if not then_stmts and not else_stmts:
+            return ast.IfExp(test=test, body=then_value, orelse=else_value)
+
+        name = self.temp()
+        then_body = then_stmts + [self.at(ast.Assign(targets=[self.store(name)], value=then_value), e.line)]
+        else_body = else_stmts + [self.at(ast.Assign(targets=[self.store(name)], value=else_value), e.line)]
+        self.stmts.append(self.at(ast.If(test=test, body=then_body, orelse=else_body), e.line))
+        return self.load(name)
+
+    def expr_For(self, e):
+        iterable = self.expr(e.iterable)
+        target = self.store(self.target(e.var))
+        self.stmts.append(self.at(ast.For(target=target, iter=iterable, body=self.block(e.body),
+                                          orelse=[]), e.line))
+        return ast.Constant(value=None)
+
+    def expr_While(self, e):
+        stmts, test = self.capture(e.test)
+        body = self.block(e.body)
+        if stmts:
+            exit = self.at(ast.If(test=ast.UnaryOp(op=ast.Not(), operand=test),
+                                  body=[self.at(ast.Break(), e.line)], orelse=[]), e.line)
+            test, body = ast.Constant(value=True), stmts + [exit] + body
+        self.stmts.append(self.at(ast.While(test=test, body=body, orelse=[]), e.line))
+        return ast.Constant(value=None)
+
+    def expr_Comprehension(self, e):
+        result = None
+        if e.kind != 'generator':
+            result = self.temp()
+            empty = ast.List(elts=[], ctx=ast.Load()) if e.kind == 'list' else ast.Dict(keys=[], values=[])
+            self.assign(e.line, result, empty)
+        self.comprehension(e, e.clauses, result)
+        return self.load(result) if result else ast.Constant(value=None)
+
+    def comprehension(self, e, clauses, result):
+        if not clauses:
+            if e.kind == 'list':
+                append = ast.Attribute(value=self.load(result), attr='append', ctx=ast.Load())
+                value = ast.Call(func=append, args=[self.expr(e.element)], keywords=[])
+                self.stmts.append(self.at(ast.Expr(value=value), e.line))
+            elif e.kind == 'dict':
+                key, value = self.values(e.element)
+                subscript = ast.Subscript(value=self.load(result), slice=self.subscript_index(key),
+                                          ctx=ast.Store())
+                self.stmts.append(self.at(ast.Assign(targets=[subscript], value=value), e.line))
+            else:
+                self.stmts.append(self.at(ast.Expr(value=ast.Yield(value=self.expr(e.element))), e.line))
+            return
+
+        var, iterable, tests = clauses[0]
+        loop = self.at(ast.For(target=self.store(self.target(var)), iter=self.expr(iterable),
+                               body=[], orelse=[]), iterable.line)
+        outer, self.stmts = self.stmts, []
+        for test in tests:
+            skip = ast.UnaryOp(op=ast.Not(), operand=self.expr(test))
+            self.stmts.append(self.at(ast.If(test=skip, body=[self.at(ast.Continue(), test.line)],
+                                             orelse=[]), test.line))
+        self.comprehension(e, clauses[1:], result)
+        loop.body, self.stmts = self.stmts, outer
+        self.stmts.append(loop)
+
+    def expr_Function(self, e):
+        return self.function(e, e.codename_at(e.line + self.line_shift))
+
+    def expr_Memoize(self, e):
+        return self.memoize(e, self.function(e.function, '<anonymous>'))
+
+    def memoize(self, e, function):
+        return self.at(ast.Call(func=self.helper('memoize'),
+                                args=[function, ast.Constant(value=e.maxsize), ast.Constant(value=e.line + self.line_shift)],
+                                keywords=[]), e.line)
+
+    def function(self, e, name):
+        self.stmts.append(self.function_def(self.scopes[id(e)], name, e.args, e))
+        return self.load(name)
+
+    def function_def(self, scope, name, args, e):
+        outer_scope, outer_stmts = self.scope, self.stmts
+        self.scope, self.stmts = scope, []
+
+        value = self.expr(e.body)
+        self.stmts.append(self.at(ast.Return(value=value), e.line))
+
+        body = []
+        if scope.nonlocals:
+            body.append(self.at(ast.Nonlocal(names=sorted(scope.nonlocals)), e.line))
+        if scope.declared_globals:
+            body.append(self.at(ast.Global(names=sorted(scope.declared_globals)), e.line))
+        if outer_scope is None:
+            for helper in sorted(self.helpers):
+                module, attr = RUNTIME[helper]
+                body.append(self.at(ast.ImportFrom(module=module, level=0,
+                    names=[ast.alias(name=attr, asname='$' + helper)]), e.line))
+        body += self.stmts
+
+        self.scope, self.stmts = outer_scope, outer_stmts
+        arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg=scope.pyname(arg)) for arg in args],
+                                  vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+        fields = {'type_params': []} if sys.version_info >= (3, 12) else {}
+        return self.at(ast.FunctionDef(name=name, args=arguments, body=body,
+                                       decorator_list=[], returns=None, **fields), e.line)
+
+    def expr_Import(self, e):
+        value = ast.Constant(value=None)
+        for module, names in e.items:
+            if e.cached:
+                name = Import.slot(module, names)
+                self.scope.declared_globals.add(name)
+                load = self.at(ast.Import(names=[ast.alias(name=module, asname=name)]), e.line)
+                self.stmts.append(self.at(ast.If(test=ast.UnaryOp(op=ast.Not(), operand=self.load(name)),
+                                                 body=[load], orelse=[]), e.line))
+            elif names is None:
+                name = module
+                self.stmts.append(self.at(ast.Import(names=[ast.alias(name=module, asname=None)]), e.line))
+            else:
+                name = self.temp()
+                self.stmts.append(self.at(ast.Import(names=[ast.alias(name=module, asname=name)]), e.line))
+
+            if names is None:
+                self.scope.declared_globals.add(module)
+                if name != module:
+                    self.assign(e.line, module, self.load(name))
+                value = self.load(module)
+                continue
+
+            for attr in names:
+                self.scope.declared_globals.add(attr)
+                self.assign(e.line, attr, ast.Attribute(value=self.load(name), attr=attr, ctx=ast.Load()))
+            value = self.load(name)
+        return value
@@ -0,0 +1,647 @@
+# -*- coding:utf8 -*-
+import dis, opcode, sys, types
+
+CO_OPTIMIZED = 0x0001
+CO_NEWLOCALS = 0x0002
+CO_GENERATOR = 0x0020
+
+BINARY_OPS = {
+    '&': 'BINARY_AND',
+    '|': 'BINARY_OR',
+    '^': 'BINARY_XOR',
+    '<<': 'BINARY_LSHIFT',
+    '>>': 'BINARY_RSHIFT',
+    '+': 'BINARY_ADD',
+    '-': 'BINARY_SUBTRACT',
+    '*': 'BINARY_MULTIPLY',
+    '/': 'BINARY_TRUE_DIVIDE',
+    '//': 'BINARY_FLOOR_DIVIDE',
+    '**': 'BINARY_POWER',
+    '%': 'BINARY_MODULO',
+}
+
+UNARY_OPS = {
+    '+': 'UNARY_POSITIVE',
+    '-': 'UNARY_NEGATIVE',
+    'not': 'UNARY_NOT',
+    '~': 'UNARY_INVERT',
+}
+
+COMPARE_MASKS = {
+    '<': 2,
+    '<=': 10,
+    '==': 8,
+    '!=': 7,
+    '>': 4,
+    '>=': 12,
+}
+
+INTRINSIC_STOPITERATION_ERROR = 3
+INTRINSIC_UNARY_POSITIVE = 5
+
+BRANCH_EFFECTS = {
+    'JUMP_IF_FALSE_OR_POP': (-1, 0),
+    'JUMP_IF_TRUE_OR_POP': (-1, 0),
+    'FOR_ITER': (1, -1),
+}
+
+UNCONDITIONAL_JUMPS = ('JUMP_ABSOLUTE', 'JUMP_FORWARD', 'JUMP_BACKWARD')
+
+LEGACY_STACK_EFFECTS = {
+    'POP_TOP': -1,
+    'DUP_TOP': 1,
+    'ROT_TWO': 0,
+    'BINARY_SUBSCR': -1,
+    'STORE_SUBSCR': -3,
+    'COMPARE_OP': -1,
+    'LOAD_ATTR': 0,
+    'STORE_ATTR': -2,
+    'RETURN_VALUE': -1,
+    'YIELD_VALUE': 0,
+    'IMPORT_NAME': -1,
+    'IMPORT_FROM': 1,
+    'GET_ITER': 0,
+    'LIST_APPEND': -1,
+    'MAP_ADD': -2,
+    'JUMP_ABSOLUTE': 0,
+    'JUMP_FORWARD': 0,
+    'POP_JUMP_IF_FALSE': -1,
+    'POP_JUMP_IF_TRUE': -1,
+    'BUILD_LIST': lambda arg: 1 - arg,
+    'BUILD_TUPLE': lambda arg: 1 - arg,
+    'BUILD_SLICE': lambda arg: 1 - arg,
+    'BUILD_MAP': 1,
+    'CALL_FUNCTION': lambda arg: -(arg & 0xFF) - 2*(arg >> 8 & 0xFF),
+    'MAKE_FUNCTION': lambda arg: -arg,
+    'MAKE_CLOSURE': lambda arg: -arg - 1,
+}
+
+def legacy_stack_effect(op, arg):
+    if op in LEGACY_STACK_EFFECTS:
+        effect = LEGACY_STACK_EFFECTS[op]
+        return effect(arg) if callable(effect) else effect
+    if op.startswith('LOAD_'):
+        return 1
+    if op.startswith('STORE_') or op.startswith('BINARY_'):
+        return -1
+    if op.startswith('UNARY_'):
+        return 0
+    raise KeyError(op)
+
+class UnsupportedVersion(Exception):
+    def __init__(self, version, backend='bytecode'):
+        super(Exception, self).__init__(
+            "Python {} is not supported by the {} backend".format('.'.join(map(str, version)), backend))
+
+class Label(object):
+    pass
+
+def select_backend(version=None):
+    version = tuple(version or sys.version_info[:2])
+    if version < (3, 6):
+        return BytecodeBackend(version)
+    if version < (3, 11):
+        return WordcodeBackend(version)
+    if version < (3, 14):
+        return AdaptiveBackend(version)
+    raise UnsupportedVersion(version)
+
+class BytecodeBackend(object):
+    def __init__(self, version):
+        self.version = version
+        self.import_level = -1 if version < (3, 0) else 0
+
+    def lower(self, gen, code):
+        result = []
+        for instr in code:
+            if isinstance(instr, Label):
+                result.append(instr)
+                continue
+
+            line, op, arg = instr
+            lowering = getattr(self, 'lower_' + op, None)
+            if lowering is None:
+                result.append(instr)
+            else:
+                result.extend((line, low_op, low_arg) for low_op, low_arg in lowering(gen, arg))
+        return result
+
+    def prologue(self, gen):
+        return []
+
+    def epilogue(self, gen):
+        return []
+
+    def lower_CALL_BEGIN(self, gen, arg):
+        return []
+
+    def lower_CALL_TARGET(self, gen, arg):
+        return []
+
+    def lower_END_FOR(self, gen, arg):
+        return []
+
+    def lower_MAP_ADD(self, gen, depth):
+        if self.version < (3, 8):
+            return [('ROT_TWO', None), ('MAP_ADD', depth)]
+        return [('MAP_ADD', depth)]
+
+    def lower_KW_NAME(self, gen, name):
+        return [('LOAD_CONST', gen.const(name))]
+
+    def lower_CALL(self, gen, arg):
+        nargs, kwnames = arg
+        return [('CALL_FUNCTION', len(kwnames)<<8 | nargs)]
+
+    def lower_BINARY(self, gen, op):
+        return [(BINARY_OPS[op], None)]
+
+    def lower_UNARY(self, gen, op):
+        return [(UNARY_OPS[op], None)]
+
+    def lower_COMPARE(self, gen, op):
+        return [('COMPARE_OP', opcode.cmp_op.index(op))]
+
+    def lower_MAKE_FUNCTION(self, gen, code):
+        result = [('LOAD_CONST', gen.const(code))]
+        if self.version >= (3, 3):
+            result.append(('LOAD_CONST', gen.const(code.co_name)))
+        result.append(('MAKE_CLOSURE' if code.co_freevars else 'MAKE_FUNCTION', 0))
+        return result
+
+    def instr_size(self, op, arg, ext):
+        return 1 if arg is None else 3 + 3*ext
+
+    def ext_count(self, arg):
+        return 1 if arg is not None and arg > 0xFFFF else 0
+
+    def jump_arg(self, op, offset, end, target):
+        return target - end if opcode.opmap[op] in opcode.hasjrel else target
+
+    def encode_instr(self, op, arg, ext):
+        code = []
+        if ext:
+            code += [opcode.opmap['EXTENDED_ARG'], (arg>>16)&0xFF, (arg>>24)&0xFF]
+        code.append(opcode.opmap[op])
+        if arg is not None:
+            code += [arg&0xFF, (arg>>8)&0xFF]
+        return code
+
+    def layout(self, code):
+        instrs = [instr for instr in code if not isinstance(instr, Label)]
+        ext = [0 if isinstance(arg, Label) else self.ext_count(arg) for line, op, arg in instrs]
+        while True:
+            labels, positions, offset = {}, [], 0
+            for instr in code:
+                if isinstance(instr, Label):
+                    labels[instr] = offset
+                else:
+                    positions.append(offset)
+                    offset += self.instr_size(instr[1], instr[2], ext[len(positions)-1])
+
+            args = []
+            for i, (line, op, arg) in enumerate(instrs):
+                if isinstance(arg, Label):
+                    end = positions[i] + self.instr_size(op, 0, ext[i])
+                    arg = self.jump_arg(op, positions[i], end, labels[arg])
+                args.append(arg)
+
+            grown = [max(e, self.ext_count(arg)) for e, arg in zip(ext, args)]
+            if grown == ext:
+                break
+            ext = grown
+
+        targets = {offset: i for i, offset in enumerate(positions)}
+        return [(positions[i], line, op, args[i], ext[i],
+                 targets.get(labels[arg], len(instrs)) if isinstance(arg, Label) else None)
+                for i, (line, op, arg) in enumerate(instrs)]
+
+    def stack_size(self, layout, starts):
+        def effect(op, arg, jump):
+            number = opcode.opmap[op]
+            arg = arg if number >= opcode.HAVE_ARGUMENT else None
+            if sys.version_info >= (3, 8):
+                return dis.stack_effect(number, arg, jump=jump)
+            if op in BRANCH_EFFECTS:
+                return BRANCH_EFFECTS[op][jump]
+            if not hasattr(dis, 'stack_effect'):
+                return legacy_stack_effect(op, arg)
+            return dis.stack_effect(number, arg)
+
+        depths, todo, deepest = dict(starts), list(starts), max(starts.values())
+        while todo:
+            i = todo.pop()
+            depth = depths[i]
+            while i < len(layout):
+                offset, line, op, arg, ext, target = layout[i]
+                if target is not None:
+                    jumped = depth + effect(op, arg, True)
+                    deepest = max(deepest, jumped)
+                    if depths.get(target, -1) < jumped:
+                        depths[target] = jumped
+                        todo.append(target)
+                depth += effect(op, arg, False)
+                deepest = max(deepest, depth)
+                if op in UNCONDITIONAL_JUMPS or op == 'RETURN_VALUE':
+                    break
+                i += 1
+                if depths.get(i, -1) >= depth:
+                    break
+                depths[i] = depth
+        return max(deepest, 1)
+
+    def line_table(self, gen, layout, size):
+        current_line = gen.lineno
+        current_offset = 0
+        lnotab = []
+
+        for offset, line, op, arg, ext, target in layout:
+            if line is None: continue
+            delta_line = line - current_line
+            if delta_line <= 0: continue
+            delta_offset = offset - current_offset
+
+            current_line = line
+            current_offset = offset
+
+            while delta_offset > 255:
+                lnotab.append(255)
+                lnotab.append(0)
+                delta_offset -= 255
+            while delta_line > 255:
+                lnotab.append(delta_offset)
+                lnotab.append(255)
+                delta_line -= 255
+                delta_offset = 0
+            lnotab.append(delta_offset)
+            lnotab.append(delta_line)
+
+        return lnotab
+
+    def handlers(self, gen, layout, body, end):
+        return []
+
+    def exception_table(self, layout, handlers):
+        return b''
+
+    def assemble(self, gen):
+        prologue = self.prologue(gen)
+        epilogue = self.epilogue(gen)
+        layout = self.layout(prologue + self.lower(gen, gen.code) + epilogue)
+        handlers = self.handlers(gen, layout, len(prologue), len(layout) - len(epilogue))
+        starts = dict([(len(prologue), 0)] +
+                      [(target, depth + lasti + 1) for start, end, target, depth, lasti in handlers])
+
+        code = []
+        for offset, line, op, arg, ext, target in layout:
+            code += self.encode_instr(op, arg, ext)
+
+        return self.code_type(gen,
+                              stacksize=self.stack_size(layout, starts),
+                              code=bytes(bytearray(code)),
+                              consts=tuple(value for _, value in gen.sorted_names(gen.consts)),
+                              names=gen.sorted_names(gen.names),
+                              varnames=gen.sorted_names(gen.varnames),
+                              linetable=bytes(bytearray(self.line_table(gen, layout, len(code)))),
+                              freevars=gen.sorted_names(gen.freevars),
+                              cellvars=gen.sorted_names(gen.cellvars),
+                              exceptiontable=self.exception_table(layout, handlers))
+
+    def code_type(self, gen, stacksize, code, consts, names, varnames, linetable, freevars, cellvars,
+                  exceptiontable):
+        args = [gen.argcount,
+                len(varnames),
+                stacksize,
+                gen.flags,
+                code,
+                consts,
+                names,
+                varnames,
+                gen.filename,
+                gen.codename or '<anonymous>',
+                gen.lineno,
+                linetable,
+                freevars,
+                cellvars]
+        if self.version >= (3, 0):
+            args.insert(1, 0)
+        if self.version >= (3, 8):
+            args.insert(1, 0)
+        return types.CodeType(*args)
+
+
+class WordcodeBackend(BytecodeBackend):
+    def prologue(self, gen):
+        if self.version >= (3, 10) and gen.flags & CO_GENERATOR:
+            return [(None, 'GEN_START', 0)]
+        return []
+
+    def lower_KW_NAME(self, gen, name):
+        return []
+
+    def lower_CALL(self, gen, arg):
+        nargs, kwnames = arg
+        if kwnames:
+            return [('LOAD_CONST', gen.const(kwnames)),
+                    ('CALL_FUNCTION_KW', nargs + len(kwnames))]
+        return [('CALL_FUNCTION', nargs)]
+
+    def lower_COMPARE(self, gen, op):
+        if self.version >= (3, 9) and op in ('in', 'not in'):
+            return [('CONTAINS_OP', int(op == 'not in'))]
+        return [('COMPARE_OP', opcode.cmp_op.index(op))]
+
+    def lower_MAKE_FUNCTION(self, gen, code):
+        return [('LOAD_CONST', gen.const(code)),
+                ('LOAD_CONST', gen.const(code.co_name)),
+                ('MAKE_FUNCTION', 8 if code.co_freevars else 0)]
+
+    def cache_count(self, op):
+        return 0
+
+    def instr_size(self, op, arg, ext):
+        return 2 * (1 + ext + self.cache_count(op))
+
+    def ext_count(self, arg):
+        count = 0
+        while arg is not None and arg > 0xFF:
+            arg >>= 8
+            count += 1
+        return count
+
+    def jump_arg(self, op, offset, end, target):
+        if opcode.opmap[op] in opcode.hasjrel:
+            target -= end
+        return target // 2 if self.version >= (3, 10) else target
+
+    def encode_instr(self, op, arg, ext):
+        arg = arg or 0
+        code = []
+        for shift in reversed(range(1, ext+1)):
+            code += [opcode.opmap['EXTENDED_ARG'], (arg >> 8*shift) & 0xFF]
+        code += [opcode.opmap[op], arg & 0xFF]
+        return code + [0, 0] * self.cache_count(op)
+
+    def line_table(self, gen, layout, size):
+        if self.version < (3, 10):
+            return super(WordcodeBackend, self).line_table(gen, layout, size)
+
+        ranges, current = [], gen.lineno
+        for i, (offset, line, op, arg, ext, target) in enumerate(layout):
+            current = line if line is not None else current
+            end = layout[i+1][0] if i+1 < len(layout) else size
+            if ranges and ranges[-1][2] == current:
+                ranges[-1][1] = end
+            else:
+                ranges.append([offset, end, current])
+
+        table, previous = [], gen.lineno
+        for start, end, line in ranges:
+            delta_line, delta_offset = line - previous, end - start
+            previous = line
+            while abs(delta_line) > 127:
+                step = 127 if delta_line > 0 else -127
+                table += [0, step & 0xFF]
+                delta_line -= step
+            while delta_offset > 254:
+                table += [254, delta_line & 0xFF]
+                delta_line, delta_offset = 0, delta_offset - 254
+            table += [delta_offset, delta_line & 0xFF]
+        return table
+
+
+class AdaptiveBackend(WordcodeBackend):
+    def __init__(self, version):
+        super(AdaptiveBackend, self).__init__(version)
+        self.binary_ops = [symbol for name, symbol in opcode._nb_ops]
+
+    def cache_count(self, op):
+        caches = opcode._inline_cache_entries
+        if isinstance(caches, dict):
+            return caches.get(op, 0)
+        return caches[opcode.opmap[op]]
+
+    def localsplus(self, gen, deref):
+        varnames = gen.sorted_names(gen.varnames)
+        cellvars = gen.sorted_names(gen.cellvars)
+        freevars = gen.sorted_names(gen.freevars)
+        name = (cellvars + freevars)[deref]
+        if name in cellvars and name in varnames:
+            return varnames.index(name)
+        slots = varnames + tuple(x for x in cellvars if x not in varnames) + freevars
+        return slots.index(name)
+
+    def prologue(self, gen):
+        result = [(None, 'MAKE_CELL', self.localsplus(gen, i)) for i in range(len(gen.cellvars))]
+        if gen.freevars:
+            result.append((None, 'COPY_FREE_VARS', len(gen.freevars)))
+        if gen.flags & CO_GENERATOR:
+            result += [(None, 'RETURN_GENERATOR', None), (None, 'POP_TOP', None)]
+        return result + [(gen.lineno, 'RESUME', 0)]
+
+    def epilogue(self, gen):
+        if self.version >= (3, 12) and gen.flags & CO_GENERATOR:
+            return [(None, 'CALL_INTRINSIC_1', INTRINSIC_STOPITERATION_ERROR), (None, 'RERAISE', 1)]
+        return []
+
+    def handlers(self, gen, layout, body, end):
+        if self.version >= (3, 12) and gen.flags & CO_GENERATOR:
+            return [(body - 1, end, end, 0, 1)]
+        return []
+
+    def exception_table(self, layout, handlers):
+        def varint(value, mark):
+            chunks = [value & 63]
+            while value >= 64:
+                value >>= 6
+                chunks.append(64 | value & 63)
+            chunks[-1] |= mark
+            return list(reversed(chunks))
+
+        table = []
+        for start, end, target, depth, lasti in handlers:
+            start, end, target = (layout[i][0] // 2 for i in (start, end, target))
+            table += varint(start, 128) + varint(end - start, 0) + varint(target, 0) + varint(depth << 1 | lasti, 0)
+        return bytes(bytearray(table))
+
+    def lower(self, gen, code):
+        code = super(AdaptiveBackend, self).lower(gen, code)
+        positions = {instr: i for i, instr in enumerate(code) if isinstance(instr, Label)}
+
+        result = []
+        for i, instr in enumerate(code):
+            if not isinstance(instr, Label):
+                line, op, arg = instr
+                if isinstance(arg, Label):
+                    backward = positions[arg] < i
+                    if op == 'JUMP_ABSOLUTE':
+                        op = 'JUMP_BACKWARD' if backward else 'JUMP_FORWARD'
+                    elif self.version < (3, 12) and op.startswith('POP_JUMP_IF_'):
+                        op = op.replace('_IF_', '_BACKWARD_IF_' if backward else '_FORWARD_IF_')
+                    instr = (line, op, arg)
+                if self.fuses_null(result, instr):
+                    previous = result.pop()
+                    global_line, _, global_arg = instr if instr[1] == 'LOAD_GLOBAL' else previous
+                    instr = (global_line, 'LOAD_GLOBAL', global_arg | 1)
+            result.append(instr)
+        return result
+
+    def fuses_null(self, result, instr):
+        if not result or isinstance(result[-1], Label) or isinstance(instr, Label):
+            return False
+        ops = (result[-1][1], instr[1])
+        if self.version < (3, 13):
+            return ops == ('PUSH_NULL', 'LOAD_GLOBAL')
+        return ops == ('LOAD_GLOBAL', 'PUSH_NULL')
+
+    def lower_CALL_BEGIN(self, gen, arg):
+        return [('PUSH_NULL', None)] if self.version < (3, 13) else []
+
+    def lower_CALL_TARGET(self, gen, arg):
+        return [('PUSH_NULL', None)] if self.version >= (3, 13) else []
+
+    def lower_END_FOR(self, gen, arg):
+        if self.version >= (3, 13):
+            return [('END_FOR', None), ('POP_TOP', None)]
+        return [('END_FOR', None)] if self.version >= (3, 12) else []
+
+    def lower_CALL(self, gen, arg):
+        nargs, kwnames = arg
+        total = nargs + len(kwnames)
+        if self.version >= (3, 13):
+            if kwnames:
+                return [('LOAD_CONST', gen.const(kwnames)), ('CALL_KW', total)]
+            return [('CALL', total)]
+
+        result = [('KW_NAMES', gen.const(kwnames))] if kwnames else []
+        if self.version < (3, 12):
+            result.append(('PRECALL', total))
+        return result + [('CALL', total)]
+
+    def lower_BINARY(self, gen, op):
+        return [('BINARY_OP', self.binary_ops.index(op))]
+
+    def lower_UNARY(self, gen, op):
+        if op == '+' and self.version >= (3, 12):
+            return [('CALL_INTRINSIC_1', INTRINSIC_UNARY_POSITIVE)]
+        if op == 'not' and self.version >= (3, 13):
+            return [('TO_BOOL', None), ('UNARY_NOT', None)]
+        return [(UNARY_OPS[op], None)]
+
+    def lower_COMPARE(self, gen, op):
+        if op in ('in', 'not in'):
+            return [('CONTAINS_OP', int(op == 'not in'))]
+        index = opcode.cmp_op.index(op)
+        if self.version >= (3, 13):
+            return [('COMPARE_OP', index << 5 | COMPARE_MASKS[op])]
+        if self.version >= (3, 12):
+            return [('COMPARE_OP', index << 4 | COMPARE_MASKS[op])]
+        return [('COMPARE_OP', index)]
+
+    def lower_MAKE_FUNCTION(self, gen, code):
+        flags = 8 if code.co_freevars else 0
+        if self.version >= (3, 13):
+            result = [('LOAD_CONST', gen.const(code)), ('MAKE_FUNCTION', None)]
+            return result + ([('SET_FUNCTION_ATTRIBUTE', flags)] if flags else [])
+        return [('LOAD_CONST', gen.const(code)), ('MAKE_FUNCTION', flags)]
+
+    def lower_DUP_TOP(self, gen, arg):
+        return [('COPY', 1)]
+
+    def lower_ROT_TWO(self, gen, arg):
+        return [('SWAP', 2)]
+
+    def lower_POP_JUMP_IF_FALSE(self, gen, label):
+        if self.version >= (3, 13):
+            return [('TO_BOOL', None), ('POP_JUMP_IF_FALSE', label)]
+        return [('POP_JUMP_IF_FALSE', label)]
+
+    def lower_boolean_jump(self, op, label):
+        if self.version < (3, 12):
+            return [(op, label)]
+        jump = 'POP_JUMP_IF_FALSE' if op == 'JUMP_IF_FALSE_OR_POP' else 'POP_JUMP_IF_TRUE'
+        to_bool = [('TO_BOOL', None)] if self.version >= (3, 13) else []
+        return [('COPY', 1)] + to_bool + [(jump, label), ('POP_TOP', None)]
+
+    def lower_JUMP_IF_FALSE_OR_POP(self, gen, label):
+        return self.lower_boolean_jump('JUMP_IF_FALSE_OR_POP', label)
+
+    def lower_JUMP_IF_TRUE_OR_POP(self, gen, label):
+        return self.lower_boolean_jump('JUMP_IF_TRUE_OR_POP', label)
+
+    def lower_LOAD_GLOBAL(self, gen, name):
+        return [('LOAD_GLOBAL', name << 1)]
+
+    def lower_LOAD_ATTR(self, gen, name):
+        return [('LOAD_ATTR', name << 1 if self.version >= (3, 12) else name)]
+
+    def lower_LOAD_FAST(self, gen, var):
+        if self.version >= (3, 12) and var >= gen.argcount:
+            return [('LOAD_FAST_CHECK', var)]
+        return [('LOAD_FAST', var)]
+
+    def lower_LOAD_DEREF(self, gen, deref):
+        return [('LOAD_DEREF', self.localsplus(gen, deref))]
+
+    def lower_STORE_DEREF(self, gen, deref):
+        return [('STORE_DEREF', self.localsplus(gen, deref))]
+
+    def lower_LOAD_CLOSURE(self, gen, deref):
+        op = 'LOAD_FAST' if self.version >= (3, 13) else 'LOAD_CLOSURE'
+        return [(op, self.localsplus(gen, deref))]
+
+    def lower_YIELD_VALUE(self, gen, arg):
+        return [('YIELD_VALUE', 0 if self.version >= (3, 12) else None), ('RESUME', 1)]
+
+    def jump_arg(self, op, offset, end, target):
+        return (end - target) // 2 if 'BACKWARD' in op else (target - end) // 2
+
+    def line_table(self, gen, layout, size):
+        def varint(value):
+            result = []
+            while value >= 64:
+                result.append(64 | value & 63)
+                value >>= 6
+            return result + [value]
+
+        table, previous, current = [], gen.lineno, gen.lineno
+        for i, (offset, line, op, arg, ext, target) in enumerate(layout):
+            current = line if line is not None else current
+            units = ((layout[i+1][0] if i+1 < len(layout) else size) - offset) // 2
+            while units:
+                length = min(units, 8)
+                delta = current - previous
+                previous = current
+                table.append(0x80 | 13 << 3 | length - 1)
+                table += varint(-delta << 1 | 1 if delta < 0 else delta << 1)
+                units -= length
+        return table
+
+    def code_type(self, gen, stacksize, code, consts, names, varnames, linetable, freevars, cellvars,
+                  exceptiontable):
+        return types.CodeType(gen.argcount,
+                              0,
+                              0,
+                              len(varnames),
+                              stacksize,
+                              gen.flags,
+                              code,
+                              consts,
+                              names,
+                              varnames,
+                              gen.filename,
+                              gen.codename or '<anonymous>',
+                              gen.codename or '<anonymous>',
+                              gen.lineno,
+                              linetable,
+                              exceptiontable,
+                              freevars,
+                              cellvars)
+
+BACKEND = None
+
+def default_backend():
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = select_backend()
+    return BACKEND
@@ -0,0 +1,53 @@
+# -*- coding:utf8 -*-
+from collections import namedtuple
+from dojo.cache import BytecodeCache, SOURCE_SUFFIX
+from dojo.compiler import compile_code
+from dojo.scanner import InvalidSyntax, UnexpectedToken
+import multiprocessing, os
+
+BuildResult = namedtuple('BuildResult', ['filename', 'status', 'line', 'column', 'message'])
+
+def sources_in(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(SOURCE_SUFFIX):
+                yield os.path.join(root, name)
+
+def build_file(task):
+    filename, cache_dir, options = task
+    cache = BytecodeCache(cache_dir)
+    try:
+        with open(filename) as f:
+            source = f.read()
+        if cache.load(source, filename, options) is not None:
+            return BuildResult(filename, 'unchanged', None, None, None)
+        if not cache.store(source, filename, compile_code(source, filename, None, options), options):
+            return BuildResult(filename, 'failed', None, None, 'could not write the compiled file')
+        return BuildResult(filename, 'compiled', None, None, None)
+    except (InvalidSyntax, UnexpectedToken) as e:
+        return BuildResult(filename, 'failed', e.line, e.column, str(e))
+    except Exception as e:
+        return BuildResult(filename, 'failed', None, None, '{}: {}'.format(type(e).__name__, e))
+
+def build(filenames, cache_dir=None, jobs=None, options=(0, (), False, 'bytecode')):
+    tasks = [(filename, cache_dir, options) for filename in filenames]
+    jobs = jobs or multiprocessing.cpu_count()
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield build_file(task)
+        return
+
+    BytecodeCache(cache_dir).makedirs()
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap_unordered(build_file, tasks, max(1, len(tasks) // (jobs * 8))):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def format_result(result):
+    if result.line is None:
+        return '{}: {}'.format(result.filename, result.message)
+    return '{}:{}:{}: {}'.format(result.filename, result.line, result.column, result.message)
@@ -0,0 +1,147 @@
+# -*- coding:utf8 -*-
+import errno, hashlib, marshal, os, sys, types
+import dojo
+from dojo.codegen import RUNTIME
+
+try:
+    from importlib.util import MAGIC_NUMBER as PYTHON_MAGIC
+except ImportError:
+    from imp import get_magic
+    PYTHON_MAGIC = get_magic()
+
+CACHE_MAGIC = b'DOJC'
+CACHE_SUFFIX = '.dojoc'
+SOURCE_SUFFIX = '.dojo'
+RUNTIME_MARKER = '<dojo.runtime>'
+
+def source_hash(source):
+    if not isinstance(source, bytes):
+        source = source.encode('utf-8')
+    return hashlib.sha1(source).hexdigest()
+
+def compiler_hash():
+    digest = hashlib.sha1()
+    package = os.path.dirname(os.path.abspath(dojo.__file__))
+    for name in sorted(os.listdir(package)):
+        if name.endswith('.py'):
+            with open(os.path.join(package, name), 'rb') as f:
+                digest.update(name.encode('utf-8') + b'\0' + f.read())
+    return digest.hexdigest()
+
+COMPILER_HASH = compiler_hash()
+
+def replace_consts(code, consts):
+    if hasattr(code, 'replace'):
+        return code.replace(co_consts=consts)
+
+    args = [code.co_argcount,
+            code.co_nlocals,
+            code.co_stacksize,
+            code.co_flags,
+            code.co_code,
+            consts,
+            code.co_names,
+            code.co_varnames,
+            code.co_filename,
+            code.co_name,
+            code.co_firstlineno,
+            code.co_lnotab,
+            code.co_freevars,
+            code.co_cellvars]
+    if sys.version_info >= (3, 0):
+        args.insert(1, code.co_kwonlyargcount)
+    return types.CodeType(*args)
+
+def freeze(code):
+    names = {id(value): name for name, value in RUNTIME.items()}
+
+    def freeze_const(value):
+        if isinstance(value, types.CodeType):
+            return freeze(value)
+        if id(value) in names:
+            return (RUNTIME_MARKER, names[id(value)])
+        return value
+
+    return replace_consts(code, tuple(map(freeze_const, code.co_consts)))
+
+def thaw(code):
+    def thaw_const(value):
+        if isinstance(value, types.CodeType):
+            return thaw(value)
+        if isinstance(value, tuple) and len(value) == 2 and value[0] == RUNTIME_MARKER:
+            return RUNTIME[value[1]]
+        return value
+
+    return replace_consts(code, tuple(map(thaw_const, code.co_consts)))
+
+class BytecodeCache(object):
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    def key(self, source, options):
+        return (COMPILER_HASH, PYTHON_MAGIC, source_hash(source), repr(options))
+
+    def path_for(self, source, filename):
+        if self.directory is None:
+            if filename.startswith('<'):
+                return None
+            return os.path.splitext(filename)[0] + CACHE_SUFFIX
+
+        if filename.startswith('<'):
+            name = source_hash(source)
+        else:
+            name = '{}.{}'.format(
+                os.path.splitext(os.path.basename(filename))[0],
+                source_hash(os.path.abspath(filename))[:16])
+        return os.path.join(self.directory, name + CACHE_SUFFIX)
+
+    def load(self, source, filename, options=()):
+        path = self.path_for(source, filename)
+        if not path or not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    return None
+                if tuple(marshal.load(f)) != self.key(source, options):
+                    return None
+                code = marshal.load(f)
+        except (IOError, OSError, EOFError, ValueError, TypeError, SystemError):
+            return None
+
+        if not isinstance(code, types.CodeType):
+            return None
+        return thaw(code)
+
+    def makedirs(self):
+        if self.directory is None or os.path.isdir(self.directory):
+            return
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def store(self, source, filename, code, options=()):
+        path = self.path_for(source, filename)
+        if not path:
+            return False
+
+        try:
+            data = marshal.dumps(self.key(source, options)) + marshal.dumps(freeze(code))
+        except ValueError:
+            return False
+
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            self.makedirs()
+            with open(tmp, 'wb') as f:
+                f.write(CACHE_MAGIC)
+                f.write(data)
+            getattr(os, 'replace', os.rename)(tmp, path)
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
@@ -1,50 +1,54 @@
 # -*- coding:utf8 -*-
-import functools, types, opcode, sys
-
-BINARY_OPS = {
-    '&': 'BINARY_AND',
-    '|': 'BINARY_OR',
-    '^': 'BINARY_XOR',
-    '<<': 'BINARY_LSHIFT',
-    '>>': 'BINARY_RSHIFT',
-    '+': 'BINARY_ADD',
-    '-': 'BINARY_SUBTRACT',
-    '*': 'BINARY_MULTIPLY',
-    '/': 'BINARY_TRUE_DIVIDE',
-    '//': 'BINARY_FLOOR_DIVIDE',
-    '**': 'BINARY_POWER',
-    '%': 'BINARY_MODULO',
-}
-
-UNARY_OPS = {
-    '+': 'UNARY_POSITIVE',
-    '-': 'UNARY_NEGATIVE',
-    'not': 'UNARY_NOT',
-    '~': 'UNARY_INVERT',
-}   
+import functools
+from dojo.ast import (Block, BooleanOp, Call, Composition, For, Function, GetAttribute, GetVariable,
+                      If, Import, Literal, PartialCall, PipeForward, Return, SetAttribute, SetSubscript,
+                      SetVariable, Yield, left_chain)
+from dojo.backend import CO_GENERATOR, CO_NEWLOCALS, CO_OPTIMIZED, Label, default_backend
+from dojo.runtime import memoize
+from dojo.visitor import Visitor
 
 BOOLEAN_OPS = {
     'and': 'JUMP_IF_FALSE_OR_POP',
     'or': 'JUMP_IF_TRUE_OR_POP',
 }
 
-CO_GENERATOR = 0x0020
+STORE_OPS = ('STORE_FAST', 'STORE_DEREF', 'STORE_GLOBAL', 'STORE_NAME')
+
+UNCONDITIONAL_OPS = ('JUMP_ABSOLUTE', 'RETURN_VALUE')
+
+CHAINED_JUMPS = ('JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP')
+
+WRITING_NODES = (Call, For, Import, PipeForward, SetAttribute, SetSubscript, SetVariable, Yield)
 
 COMPOSE = lambda f, g: lambda *args, **kwargs: g(f(*args, **kwargs))
 
-def dojo_emit(program, filename):
+RUNTIME = {
+    'compose': COMPOSE,
+    'partial': functools.partial,
+    'memoize': memoize,
+}
+
+def dojo_emit(program, filename, optimize=0, tail_calls=False, backend=None):
     code = CodeGenerator(
         codename='<root>',
         filename=filename,
         lineno=1,
         cellvars=program.cell,
-        freevars=program.free)
+        freevars=program.free,
+        optimize=optimize,
+        tail_calls=tail_calls,
+        backend=backend)
 
     code.emit(program.body)
     return code.assemble()  
 
-class CodeGenerator:
-    def __init__(self, codename, filename, lineno, argnames=(), cellvars=(), freevars=()):
+class CodeGenerator(Visitor):
+    prefix = 'emit_'
+    default = None
+
+    def __init__(self, codename, filename, lineno, argnames=(), cellvars=(), freevars=(),
+                 optimize=0, tail_calls=False, tail_name=None, flags=0, backend=None, line_shift=0):
+        super(CodeGenerator, self).__init__()
         self.argcount = len(argnames)
         self.consts = {}
         self.names = {}
@@ -52,15 +56,20 @@ class CodeGenerator:
         self.cellvars = {name:i for i,name in enumerate(cellvars)}
         self.freevars = {name:i for i,name in enumerate(freevars)}
         self.code = []
-        self.line = []
         self.filename = filename
         self.codename = codename
         self.lineno = lineno
-        self.flags = 0
+        self.flags = flags
+        self.optimize = optimize
+        self.tail_calls = tail_calls
+        self.tail_name = tail_name
+        self.argnames = argnames
+        self.start = Label()
+        self.backend = backend or default_backend()
+        self.line_shift = line_shift
 
     def emit(self, e):
-        emitter = getattr(self, 'emit_' + type(e).__name__)
-        emitter(e)
+        self.visitors[type(e)](self, e)
 
     def emit_ListLiteral(self, e):
         for expr in e.exprs:
@@ -136,86 +145,263 @@ class CodeGenerator:
         for arg in e.args:
             self.emit(arg)
         for key, arg in e.kwargs:
-            self.emit_op(None, 'LOAD_CONST', self.const(key))
+            self.emit_op(None, 'KW_NAME', key)
             self.emit(arg)
-        
+
+    def emit_callable(self, emit_target):
+        self.emit_op(None, 'CALL_BEGIN')
+        emit_target()
+        self.emit_op(None, 'CALL_TARGET')
+
+    def emit_call(self, line, nargs, kwargs=()):
+        self.emit_op(line, 'CALL', (nargs, tuple(key for key, arg in kwargs)))
+
     def emit_PartialCall(self, e):
-        self.emit_op(None, 'LOAD_CONST', self.const(functools.partial))
+        self.emit_callable(lambda: self.emit_op(None, 'LOAD_CONST', self.const(functools.partial)))
         self.emit(e.method)
         self.emit_args(e)
-        self.emit_op(e.line, 'CALL_FUNCTION', self.two(len(e.args)+1, len(e.kwargs)))
+        self.emit_call(e.line, len(e.args)+1, e.kwargs)
 
     def emit_Composition(self, e):
-        self.emit_op(None, 'LOAD_CONST', self.const(COMPOSE))
+        self.emit_callable(lambda: self.emit_op(None, 'LOAD_CONST', self.const(COMPOSE)))
         self.emit(e.lhs)
         self.emit(e.rhs)
-        self.emit_op(e.line, 'CALL_FUNCTION', self.two(2, 0))
+        self.emit_call(e.line, 2)
+
+    def writes(self, e):
+        todo = [e]
+        while todo:
+            node = todo.pop()
+            if isinstance(node, WRITING_NODES):
+                return True
+            if not isinstance(node, Function):
+                todo.extend(node.children())
+        return False
+
+    def rebinds(self, e, name):
+        todo = [e]
+        while todo:
+            node = todo.pop()
+            if isinstance(node, (SetVariable, For)) and node.var.name == name:
+                return True
+            if isinstance(node, Import) and any(name in (names or [module]) for module, names in node.items):
+                return True
+            todo.extend(node.children())
+        return False
+
+    def is_pure(self, e, moved_past):
+        if isinstance(e, (Literal, Function)):
+            return True
+        if isinstance(e, GetVariable):
+            return not any(self.writes(other) for other in moved_past)
+        if isinstance(e, GetAttribute):
+            return self.is_pure(e.target, moved_past)
+        if isinstance(e, Composition):
+            return self.is_pure(e.lhs, moved_past) and self.is_pure(e.rhs, moved_past)
+        if isinstance(e, PartialCall):
+            return (self.is_pure(e.method, moved_past) and
+                    all(self.is_pure(arg, moved_past) for arg in e.args) and
+                    all(self.is_pure(arg, moved_past) for key, arg in e.kwargs))
+        return False
+
+    def inline_call(self, e):
+        method = e.method
+
+        if isinstance(method, PartialCall):
+            keys = set(key for key, arg in method.kwargs)
+            bound = [arg for key, arg in method.kwargs]
+            if (not keys & set(key for key, arg in e.kwargs) and
+                    (all(self.is_pure(arg, e.args) for arg in bound) or
+                     all(self.is_pure(arg, bound) for arg in e.args))):
+                return self.inline_call(Call(e.line, method.method,
+                                             list(method.args) + list(e.args),
+                                             tuple(method.kwargs) + tuple(e.kwargs)))
+
+        if isinstance(method, Composition) and (self.is_pure(method.lhs, [method.rhs]) or
+                                                self.is_pure(method.rhs, [method.lhs])):
+            inner = self.inline_call(Call(e.line, method.lhs, e.args, e.kwargs))
+            return self.inline_call(Call(e.line, method.rhs, [inner], ()))
+
+        return e
 
     def emit_Call(self, e):
-        self.emit(e.method)
+        if self.optimize:
+            e = self.inline_call(e)
+
+        self.emit_callable(lambda: self.emit(e.method))
         self.emit_args(e)
-        self.emit_op(e.line, 'CALL_FUNCTION', self.two(len(e.args), len(e.kwargs)))
+        self.emit_call(e.line, len(e.args), e.kwargs)
 
     def emit_PipeForward(self, e):
-        self.emit(e.method)
+        if self.optimize:
+            return self.emit_Call(Call(e.line, e.method, [e.arg], ()))
+
+        self.emit_callable(lambda: self.emit(e.method))
         self.emit(e.arg)
-        self.emit_op(e.line, 'CALL_FUNCTION', self.two(1, 0))
+        self.emit_call(e.line, 1)
 
     def emit_BinaryOp(self, e):
-        self.emit(e.lhs)
-        self.emit(e.rhs)
-        self.emit_op(e.line, BINARY_OPS[e.op])
+        chain = left_chain(e)
+        self.emit(chain[0].lhs)
+        for node in chain:
+            self.emit(node.rhs)
+            self.emit_op(node.line, 'BINARY', node.op)
 
     def emit_CompareOp(self, e):
-        self.emit(e.lhs)
-        self.emit(e.rhs)
-        self.emit_op(e.line, 'COMPARE_OP', opcode.cmp_op.index(e.op))
+        chain = left_chain(e)
+        self.emit(chain[0].lhs)
+        for node in chain:
+            self.emit(node.rhs)
+            self.emit_op(node.line, 'COMPARE', node.op)
 
     def emit_UnaryOp(self, e):
         self.emit(e.expr)
-        self.emit_op(e.line, UNARY_OPS[e.op])
+        self.emit_op(e.line, 'UNARY', e.op)
 
     def emit_BooleanOp(self, e):
-        self.emit(e.lhs)
-        patch = self.patch_point(e.line)
-        self.emit(e.rhs)
-        self.patch_op(patch, BOOLEAN_OPS[e.op], len(self.code))
-
-    def emit_Function(self, e):
-        gen = CodeGenerator(codename=e.name, 
+        chain = left_chain(e)
+        self.emit(chain[0].lhs)
+        for node in chain:
+            end = Label()
+            self.emit_op(node.line, BOOLEAN_OPS[node.op], end)
+            self.emit(node.rhs)
+            self.mark(end)
+
+    def function_generator(self, e, tail_name):
+        gen = CodeGenerator(codename=e.codename_at(e.line + self.line_shift),
                                   filename=self.filename,
-                                  lineno = 1,
+                                  lineno = e.line + self.line_shift,
                                   argnames = e.args, 
                                   cellvars = e.cell,
-                                  freevars = e.free)
+                                  freevars = e.free,
+                                  optimize = self.optimize,
+                                  tail_calls = self.tail_calls,
+                                  tail_name = tail_name,
+                                  flags = CO_OPTIMIZED | CO_NEWLOCALS,
+                                  backend = self.backend,
+                                  line_shift = self.line_shift)
+
+        if tail_name:
+            gen.mark(gen.start)
+            gen.emit_statement(e.body, tail=True)
+        else:
+            gen.emit(e.body)
+        return gen
 
-        gen.emit(e.body)
+    def emit_Function(self, e):
+        self.emit_function(e, self.tail_calls)
+
+    def emit_Memoize(self, e):
+        self.emit_callable(lambda: self.emit_op(None, 'LOAD_CONST', self.const(memoize)))
+        self.emit_function(e.function, tail_calls=False)
+        self.emit_op(None, 'LOAD_CONST', self.const(e.maxsize))
+        self.emit_op(None, 'LOAD_CONST', self.const(e.line + self.line_shift))
+        self.emit_call(e.line, 3)
+
+    def emit_function(self, e, tail_calls):
+        tail_name = e.name if tail_calls and not e.cell and not self.rebinds(e.body, e.name) else None
+        gen = self.function_generator(e, tail_name)
+        if gen.flags & CO_GENERATOR and tail_name:
+            gen = self.function_generator(e, None)
         code = gen.assemble()
 
         if e.free:
             for var in e.free:
                 self.emit_op(e.line, 'LOAD_CLOSURE', self.deref(var))
             self.emit_op(e.line, 'BUILD_TUPLE', len(e.free))
-            self.emit_op(e.line, 'LOAD_CONST', self.const(code))
-            self.emit_op(e.line, 'MAKE_CLOSURE', 0)
-        else:
-            self.emit_op(e.line, 'LOAD_CONST', self.const(code))
-            self.emit_op(e.line, 'MAKE_FUNCTION', 0)
+        self.emit_op(e.line, 'MAKE_FUNCTION', code)
 
     def emit_If(self, e):
+        else_label, end = Label(), Label()
         self.emit(e.test)
-        patch1 = self.patch_point(e.then_body.line)
+        self.emit_op(e.then_body.line, 'POP_JUMP_IF_FALSE', else_label)
         self.emit(e.then_body)
-        patch2 = self.patch_point(e.else_body.line)
-        self.patch_op(patch1, 'POP_JUMP_IF_FALSE', len(self.code))
+        self.emit_op(e.else_body.line, 'JUMP_ABSOLUTE', end)
+        self.mark(else_label)
         self.emit(e.else_body)
-        self.patch_op(patch2, 'JUMP_ABSOLUTE', len(self.code))
+        self.mark(end)
+
+    def emit_For(self, e):
+        start, end = Label(), Label()
+        self.emit(e.iterable)
+        self.emit_op(e.line, 'GET_ITER')
+        self.mark(start)
+        self.emit_op(e.line, 'FOR_ITER', end)
+        self.emit_var(e.line, 'STORE', e.var)
+        self.emit(e.body)
+        self.emit_op(None, 'POP_TOP')
+        self.emit_op(e.line, 'JUMP_ABSOLUTE', start)
+        self.mark(end)
+        self.emit_op(e.line, 'END_FOR')
+        self.emit_op(e.line, 'LOAD_CONST', self.const(None))
+
+    def emit_While(self, e):
+        start, end = Label(), Label()
+        self.mark(start)
+        self.emit(e.test)
+        self.emit_op(e.line, 'POP_JUMP_IF_FALSE', end)
+        self.emit(e.body)
+        self.emit_op(None, 'POP_TOP')
+        self.emit_op(e.line, 'JUMP_ABSOLUTE', start)
+        self.mark(end)
+        self.emit_op(e.line, 'LOAD_CONST', self.const(None))
+
+    def emit_Comprehension(self, e):
+        if e.kind == 'generator':
+            self.flags |= CO_GENERATOR
+        else:
+            self.emit_op(e.line, 'BUILD_LIST' if e.kind == 'list' else 'BUILD_MAP', 0)
+        self.emit_clauses(e, e.clauses)
+        if e.kind == 'generator':
+            self.emit_op(e.line, 'LOAD_CONST', self.const(None))
+
+    def emit_clauses(self, e, clauses):
+        if not clauses:
+            depth = len(e.clauses) + 1
+            if e.kind == 'list':
+                self.emit(e.element)
+                self.emit_op(e.line, 'LIST_APPEND', depth)
+            elif e.kind == 'dict':
+                self.emit(e.element[0])
+                self.emit(e.element[1])
+                self.emit_op(e.line, 'MAP_ADD', depth)
+            else:
+                self.emit(e.element)
+                self.emit_op(e.line, 'YIELD_VALUE')
+                self.emit_op(None, 'POP_TOP')
+            return
+
+        var, iterable, tests = clauses[0]
+        start, skip, end = Label(), Label(), Label()
+        self.emit(iterable)
+        self.emit_op(iterable.line, 'GET_ITER')
+        self.mark(start)
+        self.emit_op(iterable.line, 'FOR_ITER', end)
+        self.emit_var(iterable.line, 'STORE', var)
+        for test in tests:
+            self.emit(test)
+            self.emit_op(test.line, 'POP_JUMP_IF_FALSE', skip)
+        self.emit_clauses(e, clauses[1:])
+        self.mark(skip)
+        self.emit_op(iterable.line, 'JUMP_ABSOLUTE', start)
+        self.mark(end)
+        self.emit_op(iterable.line, 'END_FOR')
 
     def emit_Import(self, e):
         for module, names in e.items:
-            self.emit_op(e.line, 'LOAD_CONST', self.const(-1))
+            if e.cached:
+                slot, cached = self.name(Import.slot(module, names)), Label()
+                self.emit_op(e.line, 'LOAD_GLOBAL', slot)
+                self.emit_op(e.line, 'JUMP_IF_TRUE_OR_POP', cached)
+
+            self.emit_op(e.line, 'LOAD_CONST', self.const(self.backend.import_level))
             self.emit_op(e.line, 'LOAD_CONST', self.const(tuple(names or [])))
             self.emit_op(e.line, 'IMPORT_NAME', self.name(module))
+
+            if e.cached:
+                self.emit_op(e.line, 'DUP_TOP')
+                self.emit_op(e.line, 'STORE_GLOBAL', slot)
+                self.mark(cached)
             self.emit_op(e.line, 'DUP_TOP')
             
             if names is not None:
@@ -225,6 +411,56 @@ class CodeGenerator:
             else:
                 self.emit_op(e.line, 'STORE_GLOBAL', self.name(module))
 
+    def is_self_call(self, e):
+        if isinstance(e, PipeForward):
+            e = Call(e.line, e.method, [e.arg], ())
+
+        return (isinstance(e, Call) and
+                isinstance(e.method, GetVariable) and
+                e.method.var.name == self.tail_name and
+                e.method.var.scope != 'local' and
+                len(e.args) == len(self.argnames) and
+                not e.kwargs)
+
+    def emit_statement(self, e, tail):
+        if isinstance(e, Return):
+            self.emit_statement(e.expr, True)
+            self.emit_op(e.line, 'RETURN_VALUE')
+
+        elif isinstance(e, Block) and e.exprs:
+            for expr in e.exprs[:-1]:
+                self.emit_statement(expr, False)
+                self.emit_op(None, 'POP_TOP')
+            self.emit_statement(e.exprs[-1], tail)
+
+        elif isinstance(e, If):
+            else_label, end = Label(), Label()
+            self.emit(e.test)
+            self.emit_op(e.then_body.line, 'POP_JUMP_IF_FALSE', else_label)
+            self.emit_statement(e.then_body, tail)
+            self.emit_op(e.else_body.line, 'JUMP_ABSOLUTE', end)
+            self.mark(else_label)
+            self.emit_statement(e.else_body, tail)
+            self.mark(end)
+
+        elif isinstance(e, BooleanOp):
+            end = Label()
+            self.emit(e.lhs)
+            self.emit_op(e.line, BOOLEAN_OPS[e.op], end)
+            self.emit_statement(e.rhs, tail)
+            self.mark(end)
+
+        elif tail and self.is_self_call(e):
+            args = e.args if isinstance(e, Call) else [e.arg]
+            for arg in args:
+                self.emit(arg)
+            for name in reversed(self.argnames):
+                self.emit_op(e.line, 'STORE_FAST', self.varname(name))
+            self.emit_op(e.line, 'JUMP_ABSOLUTE', self.start)
+
+        else:
+            self.emit(e)
+
     def emit_Block(self, e):
         if len(e.exprs):
             self.emit(e.exprs[0])
@@ -235,30 +471,16 @@ class CodeGenerator:
         else:
             self.emit_op(e.line, 'LOAD_CONST', self.const(None))
 
-    def two(self, arg1, arg2):
-        return arg2<<8 | arg1
+    def emit_LineShift(self, e):
+        self.line_shift += e.delta
+        self.emit(e.expr)
+        self.line_shift -= e.delta
 
     def emit_op(self, line, op, arg1=None):
-        self.code.append(opcode.opmap[op])
-        self.line.append(line)
-        if arg1 != None:
-            self.code.append(arg1&0xFF)
-            self.line.append(None)
-            self.code.append((arg1>>8)&0xFF)
-            self.line.append(None)
-
-    def patch_point(self, line):
-        self.code += [0] * 6
-        self.line += [line] + [None]*6
-        return len(self.code)-6
-
-    def patch_op(self, begin, op, arg):
-        self.code[begin] = opcode.opmap['EXTENDED_ARG']
-        self.code[begin+1] = (arg>>16)&0xFF
-        self.code[begin+2] = (arg>>24)&0xFF
-        self.code[begin+3] = opcode.opmap[op]
-        self.code[begin+4] = (arg>>0)&0xFF
-        self.code[begin+5] = (arg>>8)&0xFF
+        self.code.append((line and line + self.line_shift, op, arg1))
+
+    def mark(self, label):
+        self.code.append(label)
 
     def make_new(self, m, value):
         if value not in m:
@@ -266,7 +488,10 @@ class CodeGenerator:
         return m[value]
         
     def const(self, value):
-        return self.make_new(self.consts, value)
+        kind = type(value)
+        if kind in (float, complex):
+            kind = (kind, repr(value))
+        return self.make_new(self.consts, (kind, value))
 
     def name(self, name):
         return self.make_new(self.names, name)
@@ -279,73 +504,97 @@ class CodeGenerator:
             return self.cellvars[name]
         return self.freevars[name] + len(self.cellvars)
 
-    def make_lnotab(self):
-        current_line = self.lineno
-        current_offset = 0
-        lnotab = []
-        
-        for i, line in enumerate(self.line):
-            if line is None: continue
-            delta_line = line - current_line
-            if delta_line <= 0: continue
-            delta_offset = i - current_offset
-            if delta_offset <= 0: continue
-            
-            current_line = line
-            current_offset = i
-            
-            while delta_offset > 255:
-                lnotab.append(255)
-                lnotab.append(0)
-                delta_offset -= 255
-            while delta_line > 255:
-                lnotab.append(delta_offset)
-                lnotab.append(255)
-                delta_line -= 255
-                delta_offset = 0
-            lnotab.append(delta_offset)
-            lnotab.append(delta_line)
-            
-        return lnotab
+    def sorted_names(self, m):
+        return tuple(name for name, i in sorted(m.items(), key=lambda x:x[1]))
 
     def assemble(self):
-        make_tuple = lambda m: tuple(map(lambda x:x[0], sorted(m.items(), key=lambda x:x[1])))
-        consts = make_tuple(self.consts)
-        names = make_tuple(self.names)
-        varnames = make_tuple(self.varnames)
-        freevars = make_tuple(self.freevars)
-        cellvars = make_tuple(self.cellvars)
-        lnotab = self.make_lnotab()
-
-        if sys.version_info >= (3, 0):
-            return types.CodeType(self.argcount,
-                            0,
-                            len(self.varnames),
-                            1000, 
-                            self.flags, 
-                            bytes(self.code + [opcode.opmap['RETURN_VALUE']]), 
-                            consts, 
-                            names, 
-                            varnames, 
-                            self.filename, 
-                            self.codename or '<anonymous>', 
-                            self.lineno, 
-                            bytes(lnotab),
-                            freevars,
-                            cellvars)
+        self.emit_op(None, 'RETURN_VALUE')
+        if self.optimize:
+            self.code = peephole(self.code)
+        return self.backend.assemble(self)
+
+def peephole(code):
+    changed = True
+    while changed:
+        code, changed = peephole_pass(code)
+    return code
+
+def peephole_pass(code):
+    targets = {}
+    for i in reversed(range(len(code))):
+        if isinstance(code[i], Label):
+            following = code[i+1] if i+1 < len(code) else None
+            targets[code[i]] = targets.get(following, i+1) if isinstance(following, Label) else i+1
+
+    def window(i, n):
+        instrs = code[i:i+n]
+        if len(instrs) == n and not any(isinstance(x, Label) for x in instrs):
+            return [op for line, op, arg in instrs]
+
+    def follow(i, op, label):
+        seen = set()
+        while label not in seen:
+            seen.add(label)
+            _, target_op, target_arg = code[targets[label]]
+            if target_op != 'JUMP_ABSOLUTE' and (target_op != op or op not in CHAINED_JUMPS):
+                break
+            if op != 'JUMP_ABSOLUTE' and targets[target_arg] <= i:
+                break
+            label = target_arg
+        return label
+
+    def jumps_to_next(i, label):
+        i += 1
+        while i < len(code) and isinstance(code[i], Label):
+            if code[i] is label:
+                return True
+            i += 1
+        return False
+
+    referenced = set(instr[2] for instr in code if not isinstance(instr, Label))
+
+    result, changed, pending_line, i = [], False, None, 0
+    while i < len(code):
+        if isinstance(code[i], Label):
+            if code[i] in referenced:
+                result.append(code[i])
+            else:
+                changed = True
+            i += 1
+            continue
+
+        line, op, arg = code[i]
+        if line is None:
+            line = pending_line
+        pending_line = None
+
+        if isinstance(arg, Label):
+            target = follow(i, op, arg)
+            if op == 'JUMP_ABSOLUTE' and code[targets[target]][1] == 'RETURN_VALUE':
+                op, arg, changed = 'RETURN_VALUE', None, True
+            elif target is not arg:
+                arg, changed = target, True
+
+        ops = window(i, 3) or []
+        if ops[:1] == ['DUP_TOP'] and ops[1] in STORE_OPS and ops[2] == 'POP_TOP':
+            store_line, store_op, store_arg = code[i+1]
+            result.append((line if line is not None else store_line, store_op, store_arg))
+            i += 3
+            changed = True
+        elif window(i, 2) == ['LOAD_CONST', 'POP_TOP']:
+            pending_line = line
+            i += 2
+            changed = True
+        elif op == 'JUMP_ABSOLUTE' and jumps_to_next(i, arg):
+            pending_line = line
+            i += 1
+            changed = True
         else:
-            return types.CodeType(self.argcount,
-                            len(self.varnames),
-                            1000, 
-                            self.flags, 
-                            ''.join([chr(b) for b in self.code]) + chr(opcode.opmap['RETURN_VALUE']), 
-                            consts, 
-                            names, 
-                            varnames, 
-                            self.filename, 
-                            self.codename or '<anonymous>', 
-                            self.lineno, 
-                            ''.join([chr(b) for b in lnotab]),
-                            freevars,
-                            cellvars)
-    
+            result.append((line, op, arg))
+            i += 1
+            if op in UNCONDITIONAL_OPS:
+                while i < len(code) and not isinstance(code[i], Label):
+                    i += 1
+                    changed = True
+
+    return result, changed
@@ -1,16 +1,220 @@
 # -*- coding:utf8 -*-
 from __future__ import print_function
+from dojo.ast import LexicalContext, ModuleContext
 from dojo.parser import Parser
 from dojo.codegen import dojo_emit
-import dis
+from dojo.astgen import dojo_emit_ast
+from dojo.cache import BytecodeCache
+from dojo.optimizer import dojo_optimize
+from dojo.runtime import LRUCache
+from collections import OrderedDict
+from timeit import default_timer
+import dis, opcode, os, sys, threading, types
 
-def dojo_compile(source, filename='<string>'):
-    ast = Parser(source).program()
+BACKENDS = {
+    'bytecode': dojo_emit,
+    'ast': dojo_emit_ast,
+}
 
-    #Here should come the compiler optimizations. Should.
+def dojo_compile(source, filename='<string>', bytecode_cache=None, cache=None,
+                 optimize=0, disabled_passes=(), tail_calls=False, backend='bytecode',
+                 profile=None):
+    options = (optimize, tuple(sorted(disabled_passes)), tail_calls, backend)
+    if cache is None:
+        return DojoCallable(compile_code(source, filename, bytecode_cache, options, profile))
 
-    code = dojo_emit(ast, filename)
-    return DojoCallable(code)
+    key = (source, filename) + options
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = cache.put(key, DojoCallable(compile_code(source, filename, bytecode_cache, options, profile)))
+    elif profile is not None:
+        profile.record('cache', 0, hit=1)
+    return compiled
+
+def compile_code(source, filename, bytecode_cache=None, options=(0, (), False, 'bytecode'), profile=None,
+                 module=False):
+    if profile is None:
+        profile = NO_PROFILE
+    cache_options = options + ('module',) if module else options
+
+    code = None
+    if bytecode_cache:
+        with profile.phase('load') as phase:
+            code = bytecode_cache.load(source, filename, cache_options)
+            phase.update(hit=int(code is not None))
+
+    if code is None:
+        optimize, disabled_passes, tail_calls, backend = options
+        ast = profile.parse(source, ModuleContext() if module else None)
+        with profile.phase('optimize') as phase:
+            ast = dojo_optimize(ast, optimize, disabled_passes)
+            phase.update(nodes=profile.count_nodes(ast))
+        with profile.phase('emit') as phase:
+            code = BACKENDS[backend](ast, filename, optimize, tail_calls)
+            phase.update(profile.count_code(code))
+        if bytecode_cache:
+            with profile.phase('store'):
+                bytecode_cache.store(source, filename, code, cache_options)
+
+    return code
+
+def count_nodes(node):
+    count, todo = 0, [node]
+    while todo:
+        count += 1
+        todo.extend(todo.pop().children())
+    return count
+
+def code_objects(code):
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            for inner in code_objects(const):
+                yield inner
+
+def instruction_count(code):
+    if hasattr(dis, 'get_instructions'):
+        return sum(1 for _ in dis.get_instructions(code))
+
+    count, i, raw = 0, 0, bytearray(code.co_code)
+    while i < len(raw):
+        count += 1
+        i += 3 if raw[i] >= opcode.HAVE_ARGUMENT else 1
+    return count
+
+class Stopwatch(object):
+    def __init__(self):
+        self.seconds = 0
+        self.calls = 0
+        self.depth = 0
+
+    def time(self, function, *args, **kwargs):
+        self.calls += 1
+        if self.depth:
+            return function(*args, **kwargs)
+
+        self.depth += 1
+        start = default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.seconds += default_timer() - start
+            self.depth -= 1
+
+class TimedScanner(object):
+    def __init__(self, scanner, stopwatch):
+        self.scanner = scanner
+        self.stopwatch = stopwatch
+
+    def scan(self, source, pos, line, column, **opts):
+        return self.stopwatch.time(self.scanner.scan, source, pos, line, column, **opts)
+
+class TimedLexicalContext(LexicalContext):
+    def __init__(self, parent=None, stopwatch=None):
+        super(TimedLexicalContext, self).__init__(parent)
+        self.stopwatch = stopwatch or parent.stopwatch
+
+    def ensure(self, name, scope):
+        return self.stopwatch.time(super(TimedLexicalContext, self).ensure, name, scope)
+
+    def request(self, name, level=0):
+        return self.stopwatch.time(super(TimedLexicalContext, self).request, name, level)
+
+    def assign(self, name):
+        return self.stopwatch.time(super(TimedLexicalContext, self).assign, name)
+
+    def push(self, args):
+        return self.stopwatch.time(super(TimedLexicalContext, self).push, args)
+
+class PhaseRecorder(object):
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+        self.counters = {}
+
+    def update(self, *counters, **named):
+        self.counters.update(*counters, **named)
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.record(self.name, default_timer() - self.start, **self.counters)
+
+class CompileProfile(object):
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.phases = OrderedDict()
+
+    def record(self, name, seconds, **counters):
+        seconds += self.phases[name][0] if name in self.phases else 0
+        self.phases[name] = (seconds, counters)
+        if self.callback:
+            self.callback(name, seconds, counters)
+
+    def phase(self, name):
+        return PhaseRecorder(self, name)
+
+    def parse(self, source, ctx=None):
+        scanning, scoping = Stopwatch(), Stopwatch()
+        parser = Parser(source)
+        parser.scanner = TimedScanner(parser.scanner, scanning)
+
+        start = default_timer()
+        program = parser.program(ctx or TimedLexicalContext(stopwatch=scoping))
+        total = default_timer() - start
+
+        self.record('scan', scanning.seconds, tokens=parser.consumed, scans=parser.scans)
+        self.record('scope', scoping.seconds, resolutions=scoping.calls)
+        self.record('parse', total - scanning.seconds - scoping.seconds, nodes=self.count_nodes(program))
+        return program
+
+    def count_nodes(self, program):
+        return count_nodes(program)
+
+    def count_code(self, code):
+        codes = list(code_objects(code))
+        return {
+            'code_objects': len(codes),
+            'instructions': sum(instruction_count(c) for c in codes),
+            'consts': sum(len(c.co_consts) for c in codes),
+            'names': sum(len(c.co_names) for c in codes),
+            'varnames': sum(len(c.co_varnames) for c in codes),
+        }
+
+    def total(self):
+        return sum(seconds for seconds, _ in self.phases.values())
+
+    def report(self):
+        lines = ['{:<10} {:>10}  {}'.format('phase', 'ms', 'counters')]
+        for name, (seconds, counters) in self.phases.items():
+            lines.append('{:<10} {:>10.3f}  {}'.format(name, seconds * 1000, ' '.join(
+                '{}={}'.format(key, counters[key]) for key in sorted(counters))))
+        lines.append('{:<10} {:>10.3f}'.format('total', self.total() * 1000))
+        return '\n'.join(lines)
+
+class NoProfile(object):
+    def phase(self, name):
+        return PhaseRecorder(self, name)
+
+    def record(self, name, seconds, **counters):
+        pass
+
+    def parse(self, source, ctx=None):
+        return Parser(source).program(ctx)
+
+    def count_nodes(self, program):
+        return None
+
+    def count_code(self, code):
+        return {}
+
+NO_PROFILE = NoProfile()
+
+def code_size(code):
+    return len(code.co_code) + sum(
+        code_size(const) for const in code.co_consts if isinstance(const, types.CodeType))
 
 class DojoCallable(object):
     def __init__(self, code):
@@ -18,12 +222,108 @@ class DojoCallable(object):
         
     def __call__(self, globals = None):
         return eval(self.code, globals, {})
+
+class CompileCache(LRUCache):
+    def __init__(self, maxsize=128, maxbytes=None):
+        super(CompileCache, self).__init__(maxsize, maxbytes)
+        self.lock = threading.Lock()
+
+    def entry_size(self, key, compiled):
+        return len(key[0]) + code_size(compiled.code)
+
+    def get(self, key):
+        with self.lock:
+            return super(CompileCache, self).get(key)
+
+    def put(self, key, compiled):
+        size = self.entry_size(key, compiled)
+        with self.lock:
+            return super(CompileCache, self).put(key, compiled, size)
+
+    def clear(self):
+        with self.lock:
+            super(CompileCache, self).clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+            }
     
 if __name__ == '__main__':
-    import sys
-    
-    with open(sys.argv[1]) as f:
-        compiled = dojo_compile(f.read(), filename=sys.argv[1])
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m dojo.compiler')
+    parser.add_argument('file', nargs='?')
+    parser.add_argument('--cache-dir', help='store compiled files in this directory instead of next to the source')
+    parser.add_argument('--no-cache', action='store_true', help='always compile from source')
+    parser.add_argument('-O', dest='optimize', action='count', default=0,
+                        help='optimize the compiled code (repeat for higher levels, e.g. -OO)')
+    parser.add_argument('--disable-pass', dest='disabled_passes', action='append', default=[],
+                        help='skip an optimization pass by name')
+    parser.add_argument('--tail-calls', action='store_true',
+                        help='compile self-recursive tail calls in def functions into loops')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='bytecode',
+                        help='emit bytecode directly or go through the Python ast module')
+    parser.add_argument('--eager-imports', action='store_true',
+                        help='run imported .dojo modules at import time instead of on first attribute access')
+    parser.add_argument('--profile-compile', action='store_true',
+                        help='print time and sizes for each compile phase to stderr')
+    parser.add_argument('--profile', action='store_true',
+                        help='run under the line profiler and print time per function and line to stderr')
+    parser.add_argument('--flamegraph', metavar='FILE',
+                        help='with --profile, also write collapsed stacks for flamegraph tools to FILE')
+    parser.add_argument('--build', metavar='DIR',
+                        help='compile every .dojo file under DIR into the cache instead of running a file')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='with --build, compile in this many processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    options = (args.optimize, tuple(sorted(args.disabled_passes)), args.tail_calls, args.backend)
+    if args.build:
+        from dojo.build import build, format_result, sources_in
+        counts = {'compiled': 0, 'unchanged': 0, 'failed': 0}
+        for result in build(sources_in(args.build), args.cache_dir, args.jobs, options):
+            counts[result.status] += 1
+            if result.status == 'failed':
+                print(format_result(result), file=sys.stderr)
+        print('{compiled} compiled, {unchanged} unchanged, {failed} failed'.format(**counts))
+        sys.exit(1 if counts['failed'] else 0)
+
+    if args.file is None:
+        parser.error('a file or --build DIR is required')
+
+    cache = None if args.no_cache else BytecodeCache(args.cache_dir)
+    profile = CompileProfile() if args.profile_compile else None
+
+    with open(args.file) as f:
+        source = f.read()
+
+    from dojo.importer import install
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.file)))
+    install(cache or False, options, lazy=not args.eager_imports)
+
+    compiled = dojo_compile(source, filename=args.file, bytecode_cache=cache,
+                            optimize=args.optimize, disabled_passes=args.disabled_passes,
+                            tail_calls=args.tail_calls, backend=args.backend,
+                            profile=profile)
+    if profile:
+        print(profile.report(), file=sys.stderr)
+
+    if not args.profile:
         compiled()
+    else:
+        from dojo.profile import LineProfiler
+        profiler = LineProfiler(compiled, source)
+        try:
+            profiler.run()
+        finally:
+            profiler.report(sys.stderr)
+            if args.flamegraph:
+                with open(args.flamegraph, 'w') as f:
+                    profiler.write_collapsed(f)
         
-
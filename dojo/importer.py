@@ -0,0 +1,75 @@
+# -*- coding:utf8 -*-
+from dojo.cache import BytecodeCache, SOURCE_SUFFIX
+from dojo.compiler import DojoCallable, compile_code
+from importlib.machinery import (BYTECODE_SUFFIXES, EXTENSION_SUFFIXES, SOURCE_SUFFIXES,
+                                 ExtensionFileLoader, FileFinder, SourceFileLoader, SourcelessFileLoader)
+import os, sys
+
+try:
+    from importlib.util import LazyLoader
+except ImportError:
+    LazyLoader = None
+
+PYTHON_LOADERS = [(ExtensionFileLoader, EXTENSION_SUFFIXES),
+                  (SourceFileLoader, SOURCE_SUFFIXES),
+                  (SourcelessFileLoader, BYTECODE_SUFFIXES)]
+
+PACKAGE_INIT = '__init__' + SOURCE_SUFFIX
+DEFAULT_OPTIONS = (0, (), False, 'bytecode')
+
+class DojoLoader(object):
+    def __init__(self, fullname, path, finder):
+        self.name = fullname
+        self.path = path
+        self.finder = finder
+
+    def is_package(self, fullname):
+        return os.path.basename(self.path) == PACKAGE_INIT
+
+    def get_filename(self, fullname):
+        return self.path
+
+    def get_source(self, fullname):
+        with open(self.path) as f:
+            return f.read()
+
+    def get_code(self, fullname):
+        return compile_code(self.get_source(fullname), self.path, self.finder.cache,
+                            self.finder.options, module=True)
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        DojoCallable(self.get_code(module.__name__))(module.__dict__)
+
+class DojoFinder(object):
+    def __init__(self, cache=None, options=DEFAULT_OPTIONS, lazy=True):
+        self.cache = cache
+        self.options = options
+        self.lazy = lazy
+        self.file_finder = FileFinder.path_hook(*(PYTHON_LOADERS + [(self.loader, [SOURCE_SUFFIX])]))
+
+    def loader(self, fullname, path):
+        loader = DojoLoader(fullname, path, self)
+        if self.lazy and LazyLoader is not None:
+            return LazyLoader(loader)
+        return loader
+
+    def path_hook(self, entry):
+        return self.file_finder(entry)
+
+def install(cache=None, options=DEFAULT_OPTIONS, lazy=True):
+    uninstall()
+    finder = DojoFinder(BytecodeCache() if cache is None else cache, options, lazy)
+    sys.path_hooks.insert(0, finder.path_hook)
+    sys.path_importer_cache.clear()
+    return finder
+
+def is_dojo_hook(hook):
+    return isinstance(getattr(hook, '__self__', None), DojoFinder)
+
+def uninstall():
+    if any(map(is_dojo_hook, sys.path_hooks)):
+        sys.path_hooks[:] = [hook for hook in sys.path_hooks if not is_dojo_hook(hook)]
+        sys.path_importer_cache.clear()
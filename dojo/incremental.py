@@ -0,0 +1,241 @@
+# -*- coding:utf8 -*-
+from bisect import bisect_left, bisect_right
+from dojo.ast import Block, LexicalContext, LineShift, Program
+from dojo.parser import Parser
+
+CHUNK_SIZE = 256
+
+class Diverged(Exception):
+    pass
+
+class Replay(object):
+    def __init__(self, events, first, unused, more):
+        self.events = events
+        self.entry = first
+        self.offset = 0
+        self.consumed = 0
+        self.unused = unused
+        self.more = more
+        self.inserted = set()
+
+    def fresh(self, context, name):
+        if name in self.inserted or name not in context.variables and self.unused(name):
+            self.inserted.add(name)
+            return True
+        return False
+
+    def expects(self, context, key):
+        while True:
+            while self.entry < len(self.events) and self.offset == len(self.events[self.entry]):
+                self.entry, self.offset = self.entry + 1, 0
+            if self.entry < len(self.events) or not self.more():
+                break
+        if self.entry < len(self.events) and self.events[self.entry][self.offset][0] == key:
+            return True
+        if self.fresh(context, key[1]):
+            return False
+        raise Diverged()
+
+    def next(self):
+        self.offset += 1
+        self.consumed += 1
+        return self.events[self.entry][self.offset - 1][1]
+
+class IncrementalContext(LexicalContext):
+    def __init__(self):
+        super(IncrementalContext, self).__init__()
+        self.events = []
+        self.replay = None
+        self.depth = 0
+        self.version = 0
+        self.names = {}
+
+    def record(self, key, method, *args):
+        if self.depth:
+            return method(*args)
+
+        if self.replay is not None and self.replay.expects(self, key):
+            result = self.replay.next()
+        else:
+            self.depth += 1
+            self.version += 1
+            try:
+                result = method(*args)
+            finally:
+                self.depth -= 1
+        self.events.append((key, result))
+        return result
+
+    def ensure(self, name, scope):
+        return self.record(('ensure', name, scope), super(IncrementalContext, self).ensure, name, scope)
+
+    def request(self, name, level=0):
+        return self.record(('request', name, level), super(IncrementalContext, self).request, name, level)
+
+    def assign(self, name):
+        return self.record(('assign', name), super(IncrementalContext, self).assign, name)
+
+    def push(self, args):
+        ctx = LexicalContext(self)
+        for arg in args:
+            ctx.ensure(arg, 'local')
+        return ctx
+
+    def varnames(self, of_type):
+        version, names = self.names.get(of_type, (None, None))
+        if version != self.version:
+            names = super(IncrementalContext, self).varnames(of_type)
+            self.names[of_type] = (self.version, names)
+        return list(names)
+
+def shifted(e, delta):
+    return LineShift(e.line + delta, delta, e) if delta else e
+
+class Chunk(object):
+    def __init__(self, starts, lines, columns, parsed, exprs, events):
+        self.pos = 0
+        self.line = 0
+        self.starts = starts
+        self.lines = lines
+        self.columns = columns
+        self.parsed = parsed
+        self.exprs = exprs
+        self.events = events
+        self.names = set(key[1] for entry in events for key, result in entry)
+        self.block = Block(lines[0], [shifted(e, line - origin) for e, line, origin in zip(exprs, lines, parsed)])
+
+    def first(self):
+        return self.starts[0] + self.pos
+
+    def node(self):
+        return shifted(self.block, self.line)
+
+    def entries(self):
+        return ([s + self.pos for s in self.starts], [l + self.line for l in self.lines],
+                self.columns, self.parsed, self.exprs, self.events)
+
+def chunked(starts, lines, columns, parsed, exprs, events):
+    return [Chunk(starts[i:i+CHUNK_SIZE], lines[i:i+CHUNK_SIZE], columns[i:i+CHUNK_SIZE],
+                  parsed[i:i+CHUNK_SIZE], exprs[i:i+CHUNK_SIZE], events[i:i+CHUNK_SIZE])
+            for i in range(0, len(starts), CHUNK_SIZE)]
+
+class IncrementalParser(object):
+    def __init__(self, source):
+        self.source = source
+        self.full_parses = 0
+        self.parse()
+
+    def parse(self):
+        self.chunks = None
+        self.context = IncrementalContext()
+        self.full_parses += 1
+        entries, _ = self.parse_from(Parser(self.source), 0, None)
+        self.update(chunked(*entries))
+
+    def update(self, chunks):
+        self.chunks = chunks
+        self.firsts = [chunk.first() for chunk in chunks]
+
+    def parse_from(self, parser, resync_after, resync):
+        starts, lines, columns, exprs, events = [], [], [], [], []
+        while parser.ignore(';'):
+            if resync is not None and parser.pos >= resync_after:
+                j = resync(parser)
+                if j is not None:
+                    return (starts, lines, columns, list(lines), exprs, events), j
+            if parser.next_if('EOF'):
+                break
+
+            self.context.events = []
+            starts.append(parser.pos)
+            lines.append(parser.line)
+            columns.append(parser.column)
+            exprs.append(parser.expr(self.context))
+            events.append(self.context.events)
+            parser.expect_lf_or(';', 'EOF')
+
+        return (starts, lines, columns, list(lines), exprs, events), None
+
+    def program(self):
+        return Program(1, Block(1, [chunk.node() for chunk in self.chunks]),
+                       self.context.varnames('exported'),
+                       self.context.varnames('closure'))
+
+    def edit(self, start, end, text):
+        self.source = self.source[:start] + text + self.source[end:]
+
+        if self.chunks is None:
+            self.parse()
+            return self.program()
+
+        try:
+            self.reparse(start, end, text)
+        except Diverged:
+            self.parse()
+        except Exception:
+            self.chunks = None
+            raise
+        finally:
+            self.context.replay = None
+        return self.program()
+
+    def reparse(self, start, end, text):
+        chunks = self.chunks
+        delta = len(text) - (end - start)
+        edited_end = start + len(text)
+
+        lo = max(bisect_right(self.firsts, start) - 1, 0)
+        if lo and bisect_right(chunks[lo].starts, start - chunks[lo].pos) < 2:
+            lo -= 1
+        window = ([], [], [], [], [], [])
+        bounds = [lo, lo]
+
+        def more():
+            if bounds[1] == len(chunks):
+                return False
+            for items, extra in zip(window, chunks[bounds[1]].entries()):
+                items.extend(extra)
+            bounds[1] += 1
+            return True
+
+        more()
+        starts, lines, columns, parsed, exprs, events = window
+        first = max(bisect_right(starts, start) - 2, 0)
+        begin = starts[first] if starts else 0
+        line, column = (lines[first], columns[first]) if starts else (1, 1)
+
+        def resync(parser):
+            while starts and starts[-1] < parser.pos - delta and more():
+                pass
+            j = bisect_left(starts, parser.pos - delta)
+            if j == len(starts) or starts[j] != parser.pos - delta or j <= first:
+                return None
+            if not parser.peek().lf:
+                return None
+            if self.context.replay.consumed != sum(len(e) for e in events[first:j]):
+                return None
+            return j
+
+        parser = Parser(self.source)
+        parser.pos, parser.line, parser.column = begin, line, column
+        self.context.replay = Replay(events, first, lambda name: not any(
+            name in chunk.names for chunk in chunks[lo:]), more)
+        region, j = self.parse_from(parser, edited_end, resync)
+
+        line_delta = 0
+        if j is None:
+            while more():
+                pass
+            if self.context.replay.consumed != sum(len(e) for e in events[first:]):
+                raise Diverged()
+            j = len(starts)
+        else:
+            line_delta = parser.line - lines[j]
+
+        tail = ([s + delta for s in starts[j:]], [l + line_delta for l in lines[j:]],
+                columns[j:], parsed[j:], exprs[j:], events[j:])
+        merged = [old[:first] + new + rest for old, new, rest in zip(window, region, tail)]
+        for chunk in chunks[bounds[1]:]:
+            chunk.pos += delta
+            chunk.line += line_delta
+        self.update(chunks[:lo] + chunked(*merged) + chunks[bounds[1]:])
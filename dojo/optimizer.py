@@ -0,0 +1,187 @@
+# -*- coding:utf8 -*-
+import operator
+from dojo.ast import *
+from dojo.visitor import Transformer
+
+BINARY_OPS = {
+    '&': operator.and_,
+    '|': operator.or_,
+    '^': operator.xor,
+    '<<': operator.lshift,
+    '>>': operator.rshift,
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '**': operator.pow,
+    '%': operator.mod,
+}
+
+UNARY_OPS = {
+    '+': operator.pos,
+    '-': operator.neg,
+    'not': operator.not_,
+    '~': operator.invert,
+}
+
+COMPARE_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda a, b: a in b,
+    'not in': lambda a, b: a not in b,
+}
+
+MAX_FOLDED_SIZE = 4096
+
+def dojo_optimize(program, level=1, disabled=()):
+    return Optimizer(level, disabled).run(program)
+
+class Optimizer(object):
+    def __init__(self, level=1, disabled=()):
+        self.passes = [clazz() for clazz in PASSES
+                       if clazz.level <= level and clazz.name not in disabled]
+
+    def run(self, program):
+        for opt in self.passes:
+            program = opt.visit(program)
+        return program
+
+class Pass(Transformer):
+    name = None
+    level = 1
+
+class ConstantFolding(Pass):
+    name = 'fold'
+
+    def fold(self, e, function, *args):
+        if not all(isinstance(arg, Literal) for arg in args):
+            return e
+
+        values = [arg.value for arg in args]
+        if not self.is_small(function, *values):
+            return e
+
+        try:
+            value = function(*values)
+        except Exception:
+            return e
+
+        if isinstance(value, (str, bytes, type(u''))) and len(value) > MAX_FOLDED_SIZE:
+            return e
+        return Literal(e.line, value)
+
+    def is_small(self, function, *values):
+        ints = [isinstance(value, int) or type(value).__name__ == 'long' for value in values]
+        bits = lambda x: x.bit_length() if hasattr(x, 'bit_length') else 64
+
+        if function is operator.pow and all(ints):
+            lhs, rhs = values
+            return rhs <= 0 or bits(lhs) * rhs <= MAX_FOLDED_SIZE
+        if function is operator.lshift and all(ints):
+            lhs, rhs = values
+            return rhs <= MAX_FOLDED_SIZE
+        if function is operator.mul and len(values) == 2 and any(ints) and not all(ints):
+            n, seq = values if ints[0] else reversed(values)
+            return not hasattr(seq, '__len__') or n * len(seq) <= MAX_FOLDED_SIZE
+        if function is operator.mod and isinstance(values[0], (str, bytes, type(u''))):
+            return False
+        return True
+
+    def visit_BinaryOp(self, e):
+        self.generic_visit(e)
+        return self.fold(e, BINARY_OPS[e.op], e.lhs, e.rhs)
+
+    def visit_CompareOp(self, e):
+        self.generic_visit(e)
+        return self.fold(e, COMPARE_OPS[e.op], e.lhs, e.rhs)
+
+    def visit_UnaryOp(self, e):
+        self.generic_visit(e)
+        return self.fold(e, UNARY_OPS[e.op], e.expr)
+
+class DeadBranchElimination(Pass):
+    name = 'deadbranch'
+
+    def visit_If(self, e):
+        self.generic_visit(e)
+        if not isinstance(e.test, Literal):
+            return e
+
+        try:
+            taken = bool(e.test.value)
+        except Exception:
+            return e
+        if makes_generator(e.else_body if taken else e.then_body):
+            return e
+        return e.then_body if taken else e.else_body
+
+class BlockCollapsing(Pass):
+    name = 'blocks'
+
+    def visit_Block(self, e):
+        self.generic_visit(e)
+
+        exprs = []
+        for expr in e.exprs:
+            if isinstance(expr, Block):
+                exprs.extend(expr.exprs or [Literal(expr.line, None)])
+            else:
+                exprs.append(expr)
+
+        exprs = [expr for expr in exprs[:-1] if not isinstance(expr, Literal)] + exprs[-1:]
+        if len(exprs) == 1:
+            return exprs[0]
+        return Block(e.line, exprs)
+
+    def visit_Program(self, e):
+        body = self.visit(e.body)
+        e.body = body if isinstance(body, Block) else Block(body.line, [body])
+        return e
+
+class ImportCaching(Pass):
+    name = 'imports'
+
+    def __init__(self):
+        super(ImportCaching, self).__init__()
+        self.depth = 0
+        self.slots = []
+
+    def visit_Program(self, e):
+        self.generic_visit(e)
+        if self.slots:
+            line = e.body.line
+            e.body = Block(line, [SetVariable(line, Variable(None, slot, 'global'), Literal(line, None))
+                                  for slot in self.slots] + e.body.exprs)
+        return e
+
+    def visit_Function(self, e):
+        self.depth += 1
+        self.generic_visit(e)
+        self.depth -= 1
+        return e
+
+    def visit_Import(self, e):
+        if self.depth:
+            e.cached = True
+            for module, names in e.items:
+                slot = Import.slot(module, names)
+                if slot not in self.slots:
+                    self.slots.append(slot)
+        return e
+
+def makes_generator(e):
+    todo = [e]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, Yield) or isinstance(node, Comprehension) and node.kind == 'generator':
+            return True
+        if not isinstance(node, Function):
+            todo.extend(node.children())
+    return False
+
+PASSES = [BlockCollapsing, ConstantFolding, DeadBranchElimination, ImportCaching]
@@ -7,48 +7,50 @@ SCANNER = Scanner('+', '-', '*', '/', '//', '**', '%', '(', ')', '[', ']', '{',
                   '==', '!=', ',', '=', '@', ';', ':', '::', '..', '|>', '=>', '.',
                   '<', '<=', '>', '>=', '~', '<<', '>>', '&', '|', '^',
                   'return', 'in', 'not in', 'if', 'else', 'elif', 'and', 'or', 
-                  'not', 'import', 'def', 'yield',
+                  'not', 'import', 'def', 'yield', 'for', 'while',
                   INTEGER = r'[0-9]+', 
                   FLOAT = r'[0-9]*\.[0-9]+', 
                   IDENTIFIER = r'[_a-zA-Z][_a-zA-Z0-9]*',
                   STRING = '|'.join([r'("([^\\"]|\\.)*")',r"('([^\\']|\\.)*')"]),
                   EOF = r'$')
+
+COMPREHENSION_NAMES = {'list': '<listcomp>', 'dict': '<dictcomp>', 'generator': '<genexpr>'}
+EXPRESSION_ENDS = ('IDENTIFIER', 'INTEGER', 'FLOAT', 'STRING', ')', ']', '}')
         
+def operator_table(ops, *kinds):
+    table = {}
+    for level, op in enumerate(ops):
+        if op[0] in kinds:
+            for name in op[2:]:
+                table[name] = (level, op[0], op[1])
+    return table
+
 class Parser(TokenStream):
     def __init__(self, source):
         super(Parser, self).__init__(SCANNER, source)
 
-    def program(self):
-        ctx = LexicalContext()
+    def program(self, ctx=None):
+        ctx = ctx or LexicalContext()
         body = self.block(ctx, 'EOF')
         return Program(body.line, body, ctx.varnames('exported'), ctx.varnames('closure'))
 
-    def block(self, ctx, until):
+    def block(self, ctx, until, generator=False):
         exprs = []
         line = self.line
         while self.ignore(';') and not self.next_if(until):
+            clauses = generator and not exprs and self._first_clause(same_line=True)
+            if clauses:
+                return self.comprehension(ctx, 'generator', clauses, self.expr, until)
             exprs.append(self.expr(ctx))
             self.expect_lf_or(';', until)
         return Block(line, exprs)
         
-    def _binary(self, higher, clazz, *ops):
-        e = higher()
-        for op in iter(partial(self.next_if, *ops, stop_on_lf=True), None):
-            e = clazz(op.line, op.name, e, higher())
-        return e
-
     def _raw(self, higher, ops):
         e = higher()
         while self.maybe(*ops):
             e = ops[self.next(*ops).name](e.line, e, higher())
         return e
 
-    def _unary(self, higher, *ops):
-        op = self.next_if(*ops)
-        if op:
-            return UnaryOp(op.line, op.name, self._unary(higher, *ops))
-        return higher()
-
     def _list_of(self, what, until = None, *rest):
         args = []
         if not self.maybe(until, *rest):
@@ -64,6 +66,24 @@ class Parser(TokenStream):
     def if_expression(self, ctx):
         if self.next_if('if'):
             return self.if_test_and_bodies(ctx, If)
+        return self.loop_expression(ctx)
+
+    def loop_expression(self, ctx):
+        op = self.next_if('for')
+        if op:
+            name = self.next('IDENTIFIER').image
+            self.next('in')
+            iterable = self.expr(ctx)
+            var = ctx.request(name).to_assignment()
+            self.next(':')
+            return For(op.line, var, iterable, self.expr(ctx))
+
+        op = self.next_if('while')
+        if op:
+            test = self.expr(ctx)
+            self.next(':')
+            return While(op.line, test, self.expr(ctx))
+
         return self.yield_expression(ctx)
     
     def if_test_and_bodies(self, ctx, node):
@@ -111,10 +131,13 @@ class Parser(TokenStream):
         return self._raw(partial(self.function, ctx), {'|>': PipeForward})
 
     def function(self, ctx):
+        if self.maybe('@'):
+            return self.memo_function(ctx)
+
         op = self.next_if('/')
         if op:
             args = self._list_of(lambda: self.next('IDENTIFIER').image, '=>')
-            return self.function_body(op.line, ctx, None, args, self.function)
+            return self.function_body(op, ctx, None, args, self.function)
 
         op = self.next_if('def')
         if op:
@@ -124,17 +147,36 @@ class Parser(TokenStream):
             self.next('(')
             args = self._list_of(lambda: self.next('IDENTIFIER').image, ')')
             self.next(':')
-            return SetVariable(op.line, var, self.function_body(op.line, ctx, name, args, self.expr))
+            return SetVariable(op.line, var, self.function_body(op, ctx, name, args, self.expr))
             
             
         return self.assignment(ctx)
 
-    def function_body(self, line, ctx, name, args, body_type):
+    def memo_function(self, ctx):
+        op = self.next('@')
+        directive = self.next('IDENTIFIER')
+        if directive.image != 'memo':
+            raise UnexpectedToken(directive, ('memo',))
+
+        maxsize = 128
+        if self.next_if('(', stop_on_lf=True):
+            maxsize = int(self.next('INTEGER').image)
+            self.next(')')
+
+        if not self.maybe('def'):
+            raise UnexpectedToken(self.peek(), ('def',))
+
+        definition = self.function(ctx)
+        definition.expr = Memoize(op.line, definition.expr, maxsize)
+        return definition
+
+    def function_body(self, op, ctx, name, args, body_type):
         body_ctx = ctx.push(args)
         body = body_type(body_ctx)
-        return Function(line, name, args, body,
+        return Function(op.line, name, args, body,
                         body_ctx.varnames('exported'), 
-                        body_ctx.varnames('closure'))
+                        body_ctx.varnames('closure'),
+                        op.column)
 
     def assignment(self, ctx):
         to = self.operators(ctx)
@@ -144,28 +186,62 @@ class Parser(TokenStream):
         return to
 
     OPS = [
-        (_raw, {'::':Composition}),
-        (_binary, BooleanOp, 'or'),
-        (_binary, BooleanOp, 'and'),
-        (_unary, 'not'),
-        (_binary, CompareOp, 'in', 'not in'),
-        (_binary, CompareOp, '==', '!=', '<', '>', '<=', '>='),
-        (_binary, BinaryOp, '|'),
-        (_binary, BinaryOp, '^'),
-        (_binary, BinaryOp, '&'),
-        (_binary, BinaryOp, '<<', '>>'),
-        (_binary, BinaryOp, '+', '-'),
-        (_binary, BinaryOp, '*', '/', '//', '%'),
-        (_binary, BinaryOp, '**'),
-        (_unary, '-', '+', '~'),
+        ('raw', Composition, '::'),
+        ('binary', BooleanOp, 'or'),
+        ('binary', BooleanOp, 'and'),
+        ('unary', UnaryOp, 'not'),
+        ('binary', CompareOp, 'in', 'not in'),
+        ('binary', CompareOp, '==', '!=', '<', '>', '<=', '>='),
+        ('binary', BinaryOp, '|'),
+        ('binary', BinaryOp, '^'),
+        ('binary', BinaryOp, '&'),
+        ('binary', BinaryOp, '<<', '>>'),
+        ('binary', BinaryOp, '+', '-'),
+        ('binary', BinaryOp, '*', '/', '//', '%'),
+        ('binary', BinaryOp, '**'),
+        ('unary', UnaryOp, '-', '+', '~'),
     ]
 
+    PREFIX = operator_table(OPS, 'unary')
+    INFIX = operator_table(OPS, 'binary', 'raw')
+    INFIX_SAME_LINE = tuple(operator_table(OPS, 'binary'))
+    INFIX_ANY_LINE = tuple(operator_table(OPS, 'raw'))
+
     def operators(self, ctx):
-        current = partial(self.call, ctx)
-        for op in reversed(Parser.OPS):
-            current = partial(op[0], self, current, *op[1:])
-        return current()
+        operands, pending = [], []
+
+        def reduce():
+            level, kind, clazz, op = pending.pop()
+            if kind == 'unary':
+                operands.append(clazz(op.line, op.name, operands.pop()))
+                return
+            rhs, lhs = operands.pop(), operands.pop()
+            if kind == 'raw':
+                operands.append(clazz(lhs.line, lhs, rhs))
+            else:
+                operands.append(clazz(op.line, op.name, lhs, rhs))
+
+        while True:
+            op = self.maybe(*Parser.PREFIX)
+            while op and (not pending or Parser.PREFIX[op.name][0] >= pending[-1][0] +
+                          (pending[-1][1] != 'unary')):
+                pending.append(Parser.PREFIX[op.name] + (self.next(op.name),))
+                op = self.maybe(*Parser.PREFIX)
+
+            operands.append(self.call(ctx))
+
+            op = self.maybe(*Parser.INFIX_SAME_LINE, stop_on_lf=True) or self.maybe(*Parser.INFIX_ANY_LINE)
+            if not op:
+                break
+
+            level = Parser.INFIX[op.name][0]
+            while pending and pending[-1][0] >= level:
+                reduce()
+            pending.append(Parser.INFIX[op.name] + (self.next(op.name),))
 
+        while pending:
+            reduce()
+        return operands[0]
 
     def _named_args(self, ctx):
         self.next('@')
@@ -175,7 +251,10 @@ class Parser(TokenStream):
         return (name, expr)
 
     def _make_call(self, ctx, clazz, op, target, until):
-        args = self._list_of(lambda: self.expr(ctx), until, '@')
+        args = self._items(ctx, 'generator', self.expr, until, '@')
+        if not isinstance(args, list):
+            return clazz(op.line, target, [args], ())
+        self.next_if(until)
         if self.maybe('@'):
             kwargs = self._list_of(lambda: self._named_args(ctx), until)
         else:
@@ -218,14 +297,76 @@ class Parser(TokenStream):
         value = self.expr(ctx)
         return (key, value)
 
+    def _items(self, ctx, kind, element, until, *rest):
+        if self.maybe(until, *rest):
+            return []
+        clauses = self._first_clause(same_line=False)
+        if clauses:
+            return self.comprehension(ctx, kind, clauses, element, until)
+        items = [element(ctx)]
+        while self.next_if(',') and not self.maybe(until, *rest):
+            items.append(element(ctx))
+        return items
+
+    def _display(self, ctx, op, kind, literal, element, until):
+        items = self._items(ctx, kind, element, until)
+        if not isinstance(items, list):
+            return items
+        self.next_if(until)
+        return literal(op.line, items)
+
+    def _first_clause(self, same_line):
+        depth, last = 0, None
+        for token in self.tokens_ahead():
+            if depth == 0:
+                if token.name == 'for' and last and last.name in EXPRESSION_ENDS:
+                    if same_line and token.lf:
+                        return None
+                    return (token.begin + token.raw_len, token.line, token.column + len(token.image))
+                if token.name in (',', ';', ')', ']', '}', 'EOF'):
+                    return None
+            depth += (token.name in ('(', '[', '{')) - (token.name in (')', ']', '}'))
+            last = token
+        return None
+
+    def comprehension(self, ctx, kind, clauses_at, element, until):
+        start = (self.pos, self.line, self.column)
+        self.pos, self.line, self.column = clauses_at
+        inner = ctx.push(['.0'])
+        clauses = []
+        while not clauses or self.next_if('for'):
+            name = self.next('IDENTIFIER').image
+            self.next('in')
+            iterable = self.expr(inner if clauses else ctx)
+            if not clauses:
+                source, iterable = iterable, GetVariable(iterable.line, inner.request('.0'))
+            var = inner.ensure(name, 'local')
+            tests = []
+            while self.next_if('if'):
+                tests.append(self.expr(inner))
+            clauses.append((var, iterable, tests))
+        self.next(until)
+
+        end = (self.pos, self.line, self.column)
+        self.pos, self.line, self.column = start
+        value = element(inner)
+        self.next('for')
+        self.pos, self.line, self.column = end
+
+        line, column = start[1], start[2]
+        body = Comprehension(line, kind, value, clauses)
+        function = Function(line, COMPREHENSION_NAMES[kind], ['.0'], body,
+                            inner.varnames('exported'), inner.varnames('closure'), column)
+        return Call(line, function, [source], ())
+
     def primary(self, ctx):
         return self.expect({
             'INTEGER': lambda x: Literal(x.line, int(x.image)),
             'FLOAT': lambda x: Literal(x.line, float(x.image)),
             'STRING': lambda x: Literal(x.line, x.image[1:-1].encode('utf-8').decode('unicode-escape')),
-            'IDENTIFIER': lambda x: GetVariable(x.line, ctx.request(x.image)) if not self.next_if('=>') else self.function_body(x.line, ctx, None, [x.image], self.assignment),
-            '(': lambda x: self.block(ctx, ')'),
-            '[': lambda x: ListLiteral(x.line, self._list_of(lambda: self.expr(ctx), ']')),
-            '{': lambda x: DictLiteral(x.line, self._list_of(lambda: self._key_value(ctx), '}')),
+            'IDENTIFIER': lambda x: GetVariable(x.line, ctx.request(x.image)) if not self.next_if('=>') else self.function_body(x, ctx, None, [x.image], self.assignment),
+            '(': lambda x: self.block(ctx, ')', generator=True),
+            '[': lambda x: self._display(ctx, x, 'list', ListLiteral, self.expr, ']'),
+            '{': lambda x: self._display(ctx, x, 'dict', DictLiteral, self._key_value, '}'),
         }) 
 
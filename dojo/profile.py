@@ -0,0 +1,103 @@
+# -*- coding:utf8 -*-
+from __future__ import print_function
+from dojo.compiler import code_objects
+from timeit import default_timer
+import sys
+
+class LineProfiler(object):
+    def __init__(self, compiled, source=None, clock=default_timer):
+        self.compiled = compiled
+        self.codes = set(code_objects(compiled.code))
+        self.source = source.splitlines() if source is not None else None
+        self.clock = clock
+        self.lines = {}
+        self.functions = {}
+        self.stacks = {}
+        self.stack = []
+        self.last = None
+
+    def run(self, globals=None):
+        self.last = self.clock()
+        previous = sys.gettrace()
+        sys.settrace(self.trace)
+        try:
+            return self.compiled(globals)
+        finally:
+            sys.settrace(previous)
+            self.charge()
+
+    def charge(self):
+        now = self.clock()
+        if self.stack:
+            elapsed = now - self.last
+            code, line = self.stack[-1]
+            self.lines.setdefault((code, line), [0, 0.0])[1] += elapsed
+            self.functions[code][1] += elapsed
+            names = tuple(c.co_name for c, _ in self.stack)
+            self.stacks[names] = self.stacks.get(names, 0.0) + elapsed
+        self.last = now
+
+    def trace(self, frame, event, arg):
+        if event != 'call' or frame.f_code not in self.codes:
+            return None
+
+        self.charge()
+        self.stack.append((frame.f_code, frame.f_lineno))
+        self.functions.setdefault(frame.f_code, [0, 0.0])[0] += 1
+        return self.trace_local
+
+    def trace_local(self, frame, event, arg):
+        if event == 'line' and frame.f_lineno is not None:
+            self.charge()
+            self.stack[-1] = (frame.f_code, frame.f_lineno)
+            self.lines.setdefault((frame.f_code, frame.f_lineno), [0, 0.0])[0] += 1
+        elif event == 'return':
+            self.charge()
+            self.stack.pop()
+        return self.trace_local
+
+    def total(self):
+        return sum(seconds for calls, seconds in self.functions.values())
+
+    def function_stats(self):
+        return sorted(((code.co_name, code.co_firstlineno, calls, seconds)
+                       for code, (calls, seconds) in self.functions.items()),
+                      key=lambda x: (-x[3], x[1], x[0]))
+
+    def line_stats(self):
+        merged = {}
+        for (code, line), (hits, seconds) in self.lines.items():
+            stats = merged.setdefault((line, code.co_name), [0, 0.0])
+            stats[0] += hits
+            stats[1] += seconds
+        return sorted((line, name, hits, seconds) for (line, name), (hits, seconds) in merged.items())
+
+    def source_line(self, line):
+        if self.source is None or not 0 < line <= len(self.source):
+            return ''
+        return self.source[line-1].strip()
+
+    def report(self, out=sys.stdout):
+        total = self.total() or 1
+
+        print('{:<24} {:>6} {:>8} {:>12} {:>7}'.format('function', 'line', 'calls', 'self ms', '%'), file=out)
+        for name, line, calls, seconds in self.function_stats():
+            print('{:<24} {:>6} {:>8} {:>12.3f} {:>6.1f}%'.format(
+                name, line, calls, seconds * 1000, seconds * 100 / total), file=out)
+
+        print(file=out)
+        print('{:>6} {:<24} {:>8} {:>12} {:>7}  {}'.format('line', 'function', 'hits', 'ms', '%', 'source'), file=out)
+        for line, name, hits, seconds in self.line_stats():
+            print('{:>6} {:<24} {:>8} {:>12.3f} {:>6.1f}%  {}'.format(
+                line, name, hits, seconds * 1000, seconds * 100 / total, self.source_line(line)), file=out)
+
+    def write_collapsed(self, out):
+        for names in sorted(self.stacks):
+            micros = int(round(self.stacks[names] * 1e6))
+            if micros:
+                print('{} {}'.format(';'.join(names), micros), file=out)
+
+def profile_run(compiled, globals=None, source=None):
+    profiler = LineProfiler(compiled, source)
+    profiler.run(globals)
+    return profiler
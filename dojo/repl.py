@@ -0,0 +1,111 @@
+# -*- coding:utf8 -*-
+from __future__ import print_function
+from dojo.ast import Block, ModuleContext, Program
+from dojo.compiler import BACKENDS, DojoCallable
+from dojo.optimizer import dojo_optimize
+from dojo.parser import Parser
+from dojo.scanner import UnexpectedToken
+import traceback
+
+try:
+    input = raw_input
+except NameError:
+    pass
+
+class Session(object):
+    def __init__(self, globals=None, filename='<stdin>', optimize=0, backend='bytecode'):
+        self.globals = {'__builtins__': __builtins__} if globals is None else globals
+        self.filename = filename
+        self.optimize = optimize
+        self.backend = backend
+        self.context = ModuleContext()
+        self.buffer = ''
+        self.line = 1
+
+    @property
+    def pending(self):
+        return bool(self.buffer.strip())
+
+    def feed(self, source):
+        self.buffer += source
+        return self.consume(final=False)
+
+    def flush(self):
+        return self.consume(final=True)
+
+    def consume(self, final):
+        parser = Parser(self.buffer)
+        parser.line = self.line
+        pos, line, results = 0, self.line, []
+
+        try:
+            while parser.ignore(';') and not parser.maybe('EOF'):
+                e = parser.expr(self.context)
+                parser.expect_lf_or(';', 'EOF')
+                if not final and parser.maybe('EOF'):
+                    break
+                pos, line = parser.pos, parser.line
+                results.append(self.run(e))
+        except UnexpectedToken as e:
+            if final or e.token.name != 'EOF':
+                self.reset()
+                raise
+        except Exception:
+            self.reset()
+            raise
+
+        self.buffer, self.line = self.buffer[pos:], line
+        if final:
+            self.reset()
+        return results
+
+    def run(self, e):
+        program = dojo_optimize(Program(e.line, Block(e.line, [e]), [], []), self.optimize)
+        code = BACKENDS[self.backend](program, self.filename, self.optimize)
+        return DojoCallable(code)(self.globals)
+
+    def reset(self):
+        self.line += self.buffer.count('\n')
+        self.buffer = ''
+
+def interact(session=None):
+    session = session or Session()
+    while True:
+        try:
+            source = input('... ' if session.pending else '>>> ')
+        except EOFError:
+            print()
+            show(session.flush)
+            return
+        except KeyboardInterrupt:
+            print()
+            session.reset()
+            continue
+
+        if source.strip():
+            show(lambda: session.feed(source + '\n'))
+        else:
+            show(lambda: session.feed('\n') + session.flush())
+
+def show(results):
+    try:
+        for value in results():
+            if value is not None:
+                print(repr(value))
+    except Exception:
+        traceback.print_exc()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m dojo.repl')
+    parser.add_argument('-O', dest='optimize', action='count', default=0,
+                        help='optimize the compiled code (repeat for higher levels, e.g. -OO)')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='bytecode')
+    parser.add_argument('--eager-imports', action='store_true',
+                        help='run imported .dojo modules at import time instead of on first attribute access')
+    args = parser.parse_args()
+
+    from dojo.importer import install
+    install(options=(args.optimize, (), False, args.backend), lazy=not args.eager_imports)
+    interact(Session(optimize=args.optimize, backend=args.backend))
@@ -0,0 +1,116 @@
+# -*- coding:utf8 -*-
+import threading
+from collections import namedtuple, OrderedDict
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+KWARGS_MARK = object()
+
+MEMO_STATS = {}
+MEMO_LOCK = threading.Lock()
+
+def memoize(function, maxsize, line):
+    key = (function.__code__.co_filename, function.__name__, line)
+    with MEMO_LOCK:
+        if key not in MEMO_STATS:
+            MEMO_STATS[key] = MemoStats(maxsize)
+        return Memoized(function, maxsize, MEMO_STATS[key])
+
+def memo_stats():
+    with MEMO_LOCK:
+        return {key: stats.info() for key, stats in MEMO_STATS.items()}
+
+def memo_reset():
+    with MEMO_LOCK:
+        MEMO_STATS.clear()
+
+class MemoStats(object):
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self, currsize=None):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, currsize)
+
+class LRUCache(object):
+    def __init__(self, maxsize=128, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        try:
+            value, size = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.entries[key] = (value, size)
+        return value
+
+    def put(self, key, value, size=0):
+        if key in self.entries:
+            return self.entries[key][0]
+
+        self.entries[key] = (value, size)
+        self.bytes += size
+
+        while len(self.entries) > 1 and (
+                self.maxsize is not None and len(self.entries) > self.maxsize or
+                self.maxbytes is not None and self.bytes > self.maxbytes):
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+MISSING = object()
+
+class Memoized(object):
+    def __init__(self, function, maxsize, stats):
+        self.function = function
+        self.maxsize = maxsize
+        self.cache = LRUCache(maxsize)
+        self.stats = stats
+        self.__name__ = function.__name__
+
+    def __call__(self, *args, **kwargs):
+        key = args + (KWARGS_MARK,) + tuple(sorted(kwargs.items())) if kwargs else args
+        try:
+            value = self.cache.get(key, MISSING)
+        except TypeError:
+            self.cache.misses += 1
+            self.stats.misses += 1
+            return self.function(*args, **kwargs)
+
+        if value is not MISSING:
+            self.stats.hits += 1
+            return value
+
+        self.stats.misses += 1
+        value = self.function(*args, **kwargs)
+        if self.maxsize > 0:
+            evictions = self.cache.evictions
+            value = self.cache.put(key, value)
+            self.stats.evictions += self.cache.evictions - evictions
+        return value
+
+    def cache_info(self):
+        return CacheInfo(self.cache.hits, self.cache.misses, self.cache.evictions, self.maxsize, len(self.cache))
+
+    def cache_clear(self):
+        self.cache = LRUCache(self.maxsize)
@@ -4,18 +4,25 @@ from itertools import chain
 
 class InvalidSyntax(Exception):
     def __init__(self, line, column, source):
+        self.line = line
+        self.column = column
         super(Exception, self).__init__(
             "Invalid syntax at line {} column {}: '{}'"
             .format(line, column, source))
 
 class UnexpectedToken(Exception):
     def __init__(self, token, allowed):
+        self.token = token
+        self.line = token.line
+        self.column = token.column
         super(Exception, self).__init__(
             "Unexpected '{}' at line {} column {}, expected one of: {}"
             .format(token.name, token.line, token.column, ", ".join(
                 map(lambda x:"'{}'".format(x), sorted(allowed)))))
  
 class Token(object):
+    __slots__ = ('name', 'image', 'whites', 'begin', 'line', 'column', 'raw_len', 'lf')
+
     EOF = lambda p: Token('EOF', '', p)
  
     def __init__(self, name, whites, image, begin, line, column):
@@ -31,29 +38,39 @@ class Token(object):
 class Scanner(object):
     def __init__(self, *symbols, **named):
         self.tokens = list(chain(
-             ((x, re.compile('^(\s*)({})'.format(re.escape(x).replace('\\ ', '\s+')))) for x in symbols),
-             ((k, re.compile('^(\s*)({})'.format(v))) for k, v in named.items())))
-        
-    def best_of(self, a, b, **opts):
-        if not b or opts.get('stop_on_lf') and b.lf:
-            return a
-        if not a:
-            return b
-        return max(a, b, key=lambda x: len(x.image))
+             ((x, r'\s+'.join(map(re.escape, x.split(' ')))) for x in symbols),
+             sorted(named.items())))
+
+        words = sorted((x for x in symbols if x[0].isalpha()), key=len, reverse=True)
+        others = sorted((x for x in symbols if not x[0].isalpha()), key=len, reverse=True)
+        regexes = dict(self.tokens)
+        order = list(chain(
+            ((x, regexes[x] + r'(?![_a-zA-Z0-9])') for x in words),
+            sorted(named.items()),
+            ((x, regexes[x]) for x in others)))
+
+        self.names = {}
+        alternatives = []
+        for i, (name, regex) in enumerate(order):
+            group = 't{}'.format(i)
+            alternatives.append('(?P<{}>{})'.format(group, regex))
+            self.names[group] = name
+
+        self.pattern = re.compile(r'(\s*)(?:' + '|'.join(alternatives) + ')')
 
     def scan(self, source, pos, line, column, **opts):
-        best = None
-
-        for token in self.tokens:
-            name, pattern = token
-            match = pattern.match(source[pos:])
-            if match:
-                w, s = match.groups()[:2]
-                t_line = line+w.count('\n')
-                t_column = (len(w) - w.rfind('\n') - 1) + ('\n' not in w and column or 1)
-                best = self.best_of(best, Token(name, w, s, pos, t_line, t_column), **opts)
-        
-        return best
+        match = self.pattern.match(source, pos)
+        if not match:
+            return None
+
+        w = match.group(1)
+        if opts.get('stop_on_lf') and '\n' in w:
+            return None
+
+        s = match.group(match.lastgroup)
+        t_line = line+w.count('\n')
+        t_column = (len(w) - w.rfind('\n') - 1) + ('\n' not in w and column or 1)
+        return Token(self.names[match.lastgroup], w, s, pos, t_line, t_column)
 
 class TokenStream(object):
     def __init__(self, scanner, source):
@@ -62,10 +79,45 @@ class TokenStream(object):
         self.pos = 0
         self.line = 1
         self.column = 1
+        self.lookahead = None
+        self.ahead = {}
+        self.scans = 0
+        self.consumed = 0
+
+    def scans_per_token(self):
+        return float(self.scans) / max(self.consumed, 1)
 
     def peek(self, **opts):
-        return self.scanner.scan(self.source, self.pos, self.line, self.column, **opts)
+        if not self.lookahead or self.lookahead[0] != self.pos:
+            token = self.ahead.get(self.pos) if self.ahead else None
+            if token is None:
+                self.scans += 1
+                token = self.scanner.scan(self.source, self.pos, self.line, self.column)
+            self.lookahead = (self.pos, token)
+
+        token = self.lookahead[1]
+        if token and opts.get('stop_on_lf') and token.lf:
+            return None
+        return token
  
+    def tokens_ahead(self):
+        pos, line, column = self.pos, self.line, self.column
+        while True:
+            if self.lookahead and self.lookahead[0] == pos:
+                token = self.lookahead[1]
+            elif pos in self.ahead:
+                token = self.ahead[pos]
+            else:
+                self.scans += 1
+                token = self.scanner.scan(self.source, pos, line, column)
+            if not token:
+                return
+            self.ahead[pos] = token
+            yield token
+            if token.name == 'EOF':
+                return
+            pos, line, column = pos + token.raw_len, token.line, token.column + len(token.image)
+
     def maybe(self, *allowed, **opts):
         token = self.peek(**opts)
         if token and token.name in allowed:
@@ -80,6 +132,9 @@ class TokenStream(object):
         if token.name not in allowed:
             raise UnexpectedToken(token, allowed)
  
+        if self.ahead:
+            self.ahead.pop(self.pos, None)
+        self.consumed += 1
         self.pos += token.raw_len
         self.line = token.line
         self.column = token.column + len(token.image)
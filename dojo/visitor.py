@@ -0,0 +1,88 @@
+# -*- coding:utf8 -*-
+from dojo.ast import Node, left_chain
+
+def node_classes(base=Node):
+    for clazz in base.__subclasses__():
+        yield clazz
+        for subclass in node_classes(clazz):
+            yield subclass
+
+class DispatchTable(dict):
+    def __init__(self, owner, prefix, default=None):
+        self.owner = owner
+        self.prefix = prefix
+        self.default = default
+        for clazz in node_classes():
+            handler = self.handler(clazz)
+            if handler is not None:
+                self[clazz] = handler
+
+    def handler(self, clazz):
+        handler = getattr(self.owner, self.prefix + clazz.__name__, None)
+        if handler is None and self.default:
+            handler = getattr(self.owner, self.default)
+        return getattr(handler, '__func__', handler)
+
+    def __missing__(self, clazz):
+        handler = self.handler(clazz)
+        if handler is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                self.owner.__name__, self.prefix + clazz.__name__))
+        self[clazz] = handler
+        return handler
+
+def dispatch_table(owner, prefix, default=None):
+    tables = owner.__dict__.get('_dispatch_tables')
+    if tables is None:
+        tables = {}
+        setattr(owner, '_dispatch_tables', tables)
+
+    key = (prefix, default)
+    if key not in tables:
+        tables[key] = DispatchTable(owner, prefix, default)
+    return tables[key]
+
+class Visitor(object):
+    prefix = 'visit_'
+    default = 'generic_visit'
+
+    def __init__(self):
+        self.visitors = dispatch_table(type(self), self.prefix, self.default)
+
+    def visit(self, e):
+        return self.visitors[type(e)](self, e)
+
+    def generic_visit(self, e):
+        for child in e.children():
+            self.visit(child)
+
+class Transformer(Visitor):
+    def __init__(self):
+        super(Transformer, self).__init__()
+        self.transformed = set()
+
+    def visit(self, e):
+        done = None
+        for node in left_chain(e):
+            if done is not None:
+                node.lhs = done
+                self.transformed.add(id(done))
+            result = self.visitors[type(node)](self, node)
+            self.transformed.discard(id(done))
+            done = result
+        return done
+
+    def generic_visit(self, e):
+        for field in e.child_fields:
+            setattr(e, field, self.transform(getattr(e, field)))
+        return e
+
+    def transform(self, value):
+        if isinstance(value, (list, tuple)):
+            return type(value)(map(self.transform, value))
+        if isinstance(value, Node):
+            if id(value) in self.transformed:
+                self.transformed.discard(id(value))
+                return value
+            return self.visit(value)
+        return value
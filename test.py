@@ -1,8 +1,42 @@
 # -*- coding:utf8 -*-
 
 import unittest
+import ast
+import copy
+import dis
+import functools
+import opcode
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
 import types
 from dojo import dojo_compile, InvalidSyntax, UnexpectedToken
+from dojo.parser import Parser, SCANNER
+import dojo.cache
+from dojo.cache import BytecodeCache, compiler_hash
+from dojo.build import build, sources_in
+from dojo.importer import LazyLoader, install, uninstall
+from dojo.compiler import BACKENDS, CompileCache, CompileProfile, DojoCallable, code_objects, compile_code
+from dojo.optimizer import dojo_optimize
+from dojo.ast import *
+from dojo.runtime import CacheInfo, memo_reset, memo_stats
+from dojo.codegen import COMPOSE, dojo_emit
+import dojo.backend
+from dojo.backend import UNCONDITIONAL_JUMPS, UnsupportedVersion, select_backend
+from dojo.astgen import AstGenerator
+from dojo.profile import LineProfiler
+from dojo.visitor import Transformer, Visitor
+from dojo.repl import Session
+from dojo.incremental import IncrementalParser
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 
 class CompilerTestCase(unittest.TestCase):
@@ -393,12 +427,977 @@ class ComplexOnesTestCase(unittest.TestCase):
         self.assertEquals(['a', 'b', 'c'], dojo_compile('{"a":0,"b":1,"c":2}|>dict.items|>sorted{@key=x=>x[1]}|>map{x=>x[0]}|>list')())
 
 
+class ScannerTestCase(unittest.TestCase):
+    def test_longest_match_wins(self):
+        token = SCANNER.scan('  **2', 0, 1, 1)
+        self.assertEquals(('**', '**', 1, 3), (token.name, token.image, token.line, token.column))
+
+    def test_keyword_wins_over_identifier_of_same_length(self):
+        self.assertEquals('in', SCANNER.scan('in', 0, 1, 1).name)
+        self.assertEquals('IDENTIFIER', SCANNER.scan('int', 0, 1, 1).name)
+
+    def test_keywords_only_match_whole_words(self):
+        self.assertEquals(('IDENTIFIER', 'iffy'), (SCANNER.scan('iffy', 0, 1, 1).name, SCANNER.scan('iffy', 0, 1, 1).image))
+        self.assertEquals('not', SCANNER.scan('not inx', 0, 1, 1).name)
+        self.assertEquals('FLOAT', SCANNER.scan('.5', 0, 1, 1).name)
+        self.assertEquals('..', SCANNER.scan('..5', 0, 1, 1).name)
+
+    def test_not_followed_by_identifier_starting_with_in(self):
+        self.assertEquals(('not', 'not'), (SCANNER.scan('x not inside', 1, 1, 2).name, SCANNER.scan('x not inside', 1, 1, 2).image))
+        self.assertEquals(('IDENTIFIER', 'inside'), (SCANNER.scan('x not inside', 5, 1, 6).name, SCANNER.scan('x not inside', 5, 1, 6).image))
+        self.assertEquals('not in', SCANNER.scan('x not in side', 1, 1, 2).name)
+
+    def test_scan_from_position(self):
+        token = SCANNER.scan('abc\n  not \n in x', 3, 1, 4)
+        self.assertEquals(('not in', 2, 3), (token.name, token.line, token.column))
+
+    def test_stop_on_lf(self):
+        self.assertEquals(None, SCANNER.scan('a\n+b', 1, 1, 2, stop_on_lf=True))
+        self.assertEquals('+', SCANNER.scan('a\n+b', 1, 1, 2).name)
+
+
+class OperatorParsingTestCase(unittest.TestCase):
+    def test_precedence_and_associativity(self):
+        self.assertEquals(-7, dojo_compile('1 - 2 * 3 - 2')())
+        self.assertEquals(64, dojo_compile('2 ** 3 ** 2')())
+        self.assertEquals(4, dojo_compile('-2 ** 2')())
+        self.assertEquals(False, dojo_compile('not 1 + 1 == 2')())
+        self.assertEquals(True, dojo_compile('1 < 2 and not 2 in [1]')())
+
+    def test_unary_needs_lower_precedence_context(self):
+        self.assertRaises(UnexpectedToken, Parser('a + not b').program)
+        self.assertRaises(UnexpectedToken, Parser('- not b').program)
+
+    def test_binary_operators_stop_at_newline(self):
+        self.assertEquals(Block(1, [GetVariable(1, Variable(None, 'a', 'global')),
+                                    UnaryOp(2, '-', GetVariable(2, Variable(None, 'b', 'global')))]),
+                          Parser('a\n- b').program().body)
+        self.assertEquals('Composition', type(Parser('f\n:: g').program().body.exprs[0]).__name__)
+
+    def test_long_expressions_do_not_recurse(self):
+        terms = ['x'] * 100000
+        self.assertEquals(100000, dojo_compile('x = 1; ' + ' + '.join(terms), optimize=1)())
+        self.assertEquals(7, dojo_compile('x = 0; ' + ' or '.join(terms) + ' or 7')())
+        self.assertEquals(False, dojo_compile('x = 1; ' + ' < '.join(terms))())
+        if sys.version_info >= (3, 8):
+            self.assertEquals(100001, dojo_compile('x = 1; ' + ' + '.join(terms) + ' + (y = 1; y)',
+                                                   optimize=1, backend='ast')())
+        self.assertEquals('UnaryOp', type(Parser('-' * 100000 + '1').program().body.exprs[0]).__name__)
+
+
+class TokenStreamTestCase(unittest.TestCase):
+    def test_each_token_is_scanned_once(self):
+        parser = Parser('def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2)\n[1, 2] |> map{fib} |> list')
+        parser.program()
+        self.assertEquals(parser.consumed, parser.scans)
+        self.assertEquals(1.0, parser.scans_per_token())
+
+    def test_stop_on_lf_uses_cached_token(self):
+        parser = Parser('a\n+b')
+        parser.next('IDENTIFIER')
+        self.assertEquals(None, parser.peek(stop_on_lf=True))
+        self.assertEquals('+', parser.peek().name)
+        self.assertEquals(2, parser.scans)
+
+
+class BytecodeCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = BytecodeCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_store_and_load_code(self):
+        source = 'def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2); [1, 2] |> map{fib::str} |> list'
+        self.assertEquals(['1', '1'], dojo_compile(source, bytecode_cache=self.cache)())
+
+        code = self.cache.load(source, '<string>', (0, (), False, 'bytecode'))
+        self.assertIsInstance(code, types.CodeType)
+        self.assertEquals(['1', '1'], eval(code, None, {}))
+
+    def test_cache_hit_skips_parser(self):
+        source = '2+3'
+        dojo_compile(source, bytecode_cache=self.cache)
+
+        original = Parser.program
+        Parser.program = None
+        try:
+            self.assertEquals(5, dojo_compile(source, bytecode_cache=self.cache)())
+        finally:
+            Parser.program = original
+
+    def test_changed_source_misses(self):
+        dojo_compile('2+3', 'test.dojo', bytecode_cache=self.cache)
+        self.assertEquals(None, self.cache.load('2+4', 'test.dojo', (0, (), False, 'bytecode')))
+        self.assertEquals(6, dojo_compile('2+4', 'test.dojo', bytecode_cache=self.cache)())
+
+    def test_changed_compiler_misses(self):
+        dojo_compile('2+3', 'test.dojo', bytecode_cache=self.cache)
+        original = dojo.cache.COMPILER_HASH
+        dojo.cache.COMPILER_HASH = compiler_hash() + 'x'
+        try:
+            self.assertEquals(None, self.cache.load('2+3', 'test.dojo', (0, (), False, 'bytecode')))
+        finally:
+            dojo.cache.COMPILER_HASH = original
+        self.assertIsInstance(self.cache.load('2+3', 'test.dojo', (0, (), False, 'bytecode')), types.CodeType)
+
+    def test_corrupted_file_misses(self):
+        dojo_compile('2+3', 'test.dojo', bytecode_cache=self.cache)
+        with open(self.cache.path_for('2+3', 'test.dojo'), 'wb') as f:
+            f.write(b'garbage')
+        self.assertEquals(None, self.cache.load('2+3', 'test.dojo', (0, (), False, 'bytecode')))
+
+    def test_cache_next_to_source(self):
+        filename = os.path.join(self.directory, 'test.dojo')
+        BytecodeCache().store('42', filename, dojo_compile('42').code)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'test.dojoc')))
+
+class BuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = os.path.join(self.directory, 'cache')
+        for name, source in [('a.dojo', '2+3'), ('sub/b.dojo', 'def f(x): x * 2; f(21)'),
+                             ('sub/bad.dojo', '1\n  )'), ('notes.txt', '')]:
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(source)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def statuses(self, jobs):
+        return sorted((os.path.relpath(r.filename, self.directory), r.status, r.line, r.column)
+                      for r in build(sources_in(self.directory), self.cache, jobs))
+
+    def test_build_compiles_into_cache_and_reports_failures(self):
+        self.assertEquals([('a.dojo', 'compiled', None, None),
+                           (os.path.join('sub', 'b.dojo'), 'compiled', None, None),
+                           (os.path.join('sub', 'bad.dojo'), 'failed', 2, 3)], self.statuses(2))
+
+        filename = os.path.join(self.directory, 'sub', 'b.dojo')
+        code = BytecodeCache(self.cache).load('def f(x): x * 2; f(21)', filename, (0, (), False, 'bytecode'))
+        self.assertEquals(42, eval(code, None, {}))
+
+    def test_build_skips_unchanged_files(self):
+        self.statuses(1)
+        with open(os.path.join(self.directory, 'a.dojo'), 'w') as f:
+            f.write('2+4')
+        self.assertEquals(['compiled', 'unchanged', 'failed'], [s[1] for s in self.statuses(2)])
+
+    def test_parallel_build_creates_missing_cache_directory(self):
+        for i in range(12):
+            with open(os.path.join(self.directory, 'm{}.dojo'.format(i)), 'w') as f:
+                f.write('{} * 2'.format(i))
+        self.cache = os.path.join(self.directory, 'new', 'cache')
+        statuses = [s[1] for s in self.statuses(6)]
+        self.assertEquals(['compiled'] * 14, [s for s in statuses if s != 'failed'])
+        self.assertEquals(1, statuses.count('failed'))
+        self.assertEquals(14, len(os.listdir(self.cache)))
+
+class ImporterTestCase(unittest.TestCase):
+    MODULES = [('dojomod.dojo', 'def double(x): x * 2\ncalls = 0\ncall = /=> calls = calls + 1\n'),
+               ('dojopkg/__init__.dojo', 'import dojomod\nquad = /x=> dojomod.double(dojomod.double(x))\n'),
+               ('dojopkg/sub.dojo', 'import dojomod(double)\nvalue = double(21)\n'),
+               ('dojobroken.dojo', 'undefined_name\n')]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name, source in self.MODULES:
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(source)
+        sys.path.insert(0, self.directory)
+        self.cache = BytecodeCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        uninstall()
+        sys.path.remove(self.directory)
+        for name in list(sys.modules):
+            if name.startswith(('dojomod', 'dojopkg', 'dojobroken')):
+                del sys.modules[name]
+        shutil.rmtree(self.directory)
+
+    def test_python_and_dojo_import_dojo_modules(self):
+        install(self.cache)
+        import dojomod, dojopkg.sub
+        self.assertEquals(12, dojopkg.quad(3))
+        self.assertEquals(42, dojopkg.sub.value)
+        self.assertEquals([1, 2, 2], [dojomod.call(), dojomod.call(), dojomod.calls])
+        self.assertEquals(2, dojo_compile('import dojomod; dojomod.calls')())
+        self.assertEquals(3, len(os.listdir(self.cache.directory)))
+
+    def test_modules_load_from_disk_cache(self):
+        install(self.cache)
+        import dojomod
+        self.assertEquals(2, dojomod.double(1))
+        del sys.modules['dojomod']
+
+        original = Parser.program
+        Parser.program = None
+        try:
+            import dojomod
+            self.assertEquals(8, dojomod.double(4))
+        finally:
+            Parser.program = original
+
+    @unittest.skipIf(LazyLoader is None, 'lazy loading needs importlib.util.LazyLoader')
+    def test_lazy_modules_run_on_first_use(self):
+        install(self.cache)
+        import dojobroken
+        self.assertRaises(NameError, getattr, dojobroken, 'anything')
+
+    def test_eager_modules_run_on_import(self):
+        install(self.cache, lazy=False)
+        try:
+            import dojobroken
+        except NameError:
+            pass
+        else:
+            self.fail('dojobroken should fail while importing')
+        self.assertNotIn('dojobroken', sys.modules)
+
+    def test_compile_options_apply_to_imported_modules(self):
+        options = (1, ('fold',), True, 'bytecode')
+        install(self.cache, options)
+        import dojomod
+        self.assertEquals(8, dojomod.double(4))
+        source, filename = self.MODULES[0][1], os.path.join(self.directory, 'dojomod.dojo')
+        self.assertIsNotNone(self.cache.load(source, filename, options + ('module',)))
+        self.assertIsNone(self.cache.load(source, filename, (0, (), False, 'bytecode', 'module')))
+
+    def test_python_modules_take_precedence(self):
+        for name in ['dojoshadow.py', 'dojoshadow.dojo', 'colorsys.dojo']:
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write('shadowed = 1\n')
+        sys.path.remove(self.directory)
+        sys.path.append(self.directory)
+        colorsys = sys.modules.pop('colorsys', None)
+        install(self.cache)
+        try:
+            import dojoshadow, colorsys as stdlib
+            self.assertTrue(dojoshadow.__file__.endswith('.py'))
+            self.assertFalse(hasattr(stdlib, 'shadowed'))
+        finally:
+            del sys.modules['dojoshadow']
+            if colorsys is not None:
+                sys.modules['colorsys'] = colorsys
+
+
+class CompileCacheTestCase(unittest.TestCase):
+    def test_same_source_returns_same_callable(self):
+        cache = CompileCache()
+        first = dojo_compile('x*2', cache=cache)
+        self.assertIs(first, dojo_compile('x*2', cache=cache))
+        self.assertIsNot(first, dojo_compile('x*2', 'other.dojo', cache=cache))
+        self.assertEquals(84, first({'x': 42}))
+        self.assertEquals({'hits': 1, 'misses': 2, 'evictions': 0, 'entries': 2},
+                          dict((k, v) for k, v in cache.stats().items() if k != 'bytes'))
+
+    def test_evicts_least_recently_used(self):
+        cache = CompileCache(maxsize=2)
+        first = dojo_compile('1', cache=cache)
+        dojo_compile('2', cache=cache)
+        dojo_compile('1', cache=cache)
+        dojo_compile('3', cache=cache)
+
+        self.assertIs(first, dojo_compile('1', cache=cache))
+        self.assertEquals(1, cache.stats()['evictions'])
+        self.assertNotIn(('2', '<string>'), cache.entries)
+
+    def test_evicts_by_bytes(self):
+        cache = CompileCache(maxsize=None, maxbytes=1)
+        dojo_compile('1', cache=cache)
+        dojo_compile('2', cache=cache)
+        self.assertEquals(1, cache.stats()['entries'])
+        self.assertEquals(1, cache.stats()['evictions'])
+
+    def test_thread_safety(self):
+        cache = CompileCache(maxsize=10)
+        errors = []
+
+        def work():
+            try:
+                for i in range(200):
+                    self.assertEquals(i % 20, dojo_compile(str(i % 20), cache=cache)())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work) for i in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+
+        stats = cache.stats()
+        self.assertEquals([], errors)
+        self.assertEquals(800, stats['hits'] + stats['misses'])
+        self.assertEquals(10, stats['entries'])
+
+
+class CompileProfileTestCase(unittest.TestCase):
+    def test_records_each_phase(self):
+        profile = CompileProfile()
+        compiled = dojo_compile('def f(x): x + 1; f(41)', profile=profile)
+        self.assertEquals(42, compiled())
+        self.assertEquals(['scan', 'scope', 'parse', 'optimize', 'emit'], list(profile.phases))
+
+        counters = dict((name, counters) for name, (seconds, counters) in profile.phases.items())
+        self.assertEquals(15, counters['scan']['tokens'])
+        self.assertEquals(counters['parse']['nodes'], counters['optimize']['nodes'])
+        self.assertEquals(2, counters['emit']['code_objects'])
+        self.assertGreater(counters['emit']['instructions'], 0)
+        self.assertIn('total', profile.report())
+
+    def test_callback_and_cache_hit(self):
+        cache, seen = CompileCache(), []
+        profile = CompileProfile(lambda name, seconds, counters: seen.append(name))
+        dojo_compile('x', cache=cache, profile=profile)
+        dojo_compile('x', cache=cache, profile=profile)
+        self.assertEquals(['scan', 'scope', 'parse', 'optimize', 'emit', 'cache'], seen)
+        self.assertEquals({'hit': 1}, profile.phases['cache'][1])
+
+
+class LineProfilerTestCase(unittest.TestCase):
+    SOURCE = 'def twice(x): x * 2\nys = [1, 2, 3] |> map{/y=>twice(y)} |> list\nlen(ys)'
+
+    def profile(self):
+        ticks = iter(range(1000))
+        profiler = LineProfiler(dojo_compile(self.SOURCE), self.SOURCE, clock=lambda: next(ticks))
+        self.assertEquals(3, profiler.run())
+        return profiler
+
+    def test_anonymous_functions_are_named_by_position(self):
+        lambdas = [code.co_name for code in dojo_compile('f = /x=>x\ng = y => y').code.co_consts
+                   if isinstance(code, types.CodeType)]
+        self.assertEquals(['<lambda@1:5>', '<lambda@2:5>'], lambdas)
+
+    def test_counts_calls_and_lines(self):
+        functions = dict((name, calls) for name, line, calls, seconds in self.profile().function_stats())
+        self.assertEquals({'<root>': 1, 'twice': 3, '<lambda@2:23>': 3}, functions)
+
+        lines = dict(((line, name), hits) for line, name, hits, seconds in self.profile().line_stats())
+        self.assertEquals(3, lines[(1, 'twice')])
+        self.assertEquals(1, lines[(3, '<root>')])
+
+    def test_time_adds_up_across_reports(self):
+        profiler = self.profile()
+        collapsed = StringIO()
+        profiler.write_collapsed(collapsed)
+
+        stacks = dict(line.rsplit(' ', 1) for line in collapsed.getvalue().splitlines())
+        self.assertIn('<root>;<lambda@2:23>;twice', stacks)
+        self.assertEquals(profiler.total() * 1e6, sum(map(int, stacks.values())))
+        self.assertEquals(profiler.total(), sum(seconds for line, name, hits, seconds in profiler.line_stats()))
+
+
+class NodeTestCase(unittest.TestCase):
+    def test_nodes_have_no_instance_dict(self):
+        program = Parser('f = /x=>x + 1\nf(2)').program()
+        self.assertFalse(hasattr(program.body.exprs[0], '__dict__'))
+        self.assertFalse(hasattr(program.body.exprs[0].var, '__dict__'))
+        self.assertFalse(hasattr(SCANNER.scan('x', 0, 1, 1), '__dict__'))
+
+    def test_structural_equality(self):
+        source = 'def f(a): {a: [1, 2][0..1]}; f(2) |> print'
+        self.assertEquals(Parser(source).program(), Parser(source).program())
+        self.assertNotEqual(Parser(source).program(), Parser(source.replace('2', '3')).program())
+
+    def test_children(self):
+        e = Parser('{1: 2, 3: f(4, @x=5)}').program().body.exprs[0]
+        self.assertEquals(['Literal', 'Literal', 'Literal', 'Call'],
+                          [type(child).__name__ for child in e.children()])
+        self.assertEquals(['GetVariable', 'Literal', 'Literal'],
+                          [type(child).__name__ for child in e.items[1][1].children()])
+
+
+class VisitorTestCase(unittest.TestCase):
+    def test_generic_visit_walks_children_in_order(self):
+        class Names(Visitor):
+            def __init__(self):
+                super(Names, self).__init__()
+                self.names = []
+
+            def visit_GetVariable(self, e):
+                self.names.append(e.var.name)
+
+        visitor = Names()
+        visitor.visit(Parser('a(b, @k=c) + {d: [e][f]}; g => h').program())
+        self.assertEquals(['a', 'b', 'c', 'd', 'e', 'f', 'h'], visitor.names)
+
+    def test_transformer_replaces_nodes(self):
+        class Double(Transformer):
+            def visit_Literal(self, e):
+                return Literal(e.line, e.value * 2)
+
+        program = Double().visit(Parser('[1, 2] + [3]').program())
+        self.assertEquals([2, 4, 6], DojoCallable(dojo_emit(program, '<string>'))())
+
+    def test_missing_handler_raises(self):
+        class Strict(Visitor):
+            default = None
+
+        self.assertRaises(AttributeError, Strict().visit, Literal(1, 1))
+
+
+class OptimizerTestCase(unittest.TestCase):
+    def optimize(self, source, level=1, disabled=()):
+        return dojo_optimize(Parser(source).program(), level, disabled).body
+
+    def test_constant_folding(self):
+        body = self.optimize('2+3*4; -(2**3); not 2+2==5; 1 in [1]')
+        self.assertEquals([14, -8, True], [e.value for e in body.exprs[:3]])
+        self.assertIsInstance(body.exprs[3], CompareOp)
+
+    def test_folding_keeps_failing_and_huge_expressions(self):
+        body = self.optimize('1/0; 2**100000; "a"*100000')
+        self.assertEquals([BinaryOp]*3, [type(e) for e in body.exprs])
+
+    def test_folding_skips_string_formatting(self):
+        body = self.optimize('"%0999999999d" % 1; "%s" % 1; 7 % 3')
+        self.assertEquals([BinaryOp, BinaryOp, Literal], [type(e) for e in body.exprs])
+        self.assertEquals(1, body.exprs[2].value)
+
+    def test_signed_zeros_stay_distinct(self):
+        for level in (0, 1):
+            self.assertEquals('[0.0, -0.0]', repr(dojo_compile('[0.0, -0.0]', optimize=level)()))
+            self.assertEquals('[-0.0, 0.0]', repr(dojo_compile('x = -0.0; y = 0.0; [x, y]', optimize=level)()))
+
+    def test_dead_branch_elimination(self):
+        body = self.optimize('if 2+2==5: a() elif 1: b() else: c()')
+        self.assertIsInstance(body.exprs[0], Call)
+        self.assertEquals('b', body.exprs[0].method.var.name)
+
+    def test_dead_branch_keeps_generators(self):
+        source = 'def g(): (if 0: yield 1 else: 2); r = g(); [type(r), list(r)]'
+        self.assertEquals([types.GeneratorType, []], dojo_compile(source, optimize=0)())
+        self.assertEquals([types.GeneratorType, []], dojo_compile(source, optimize=1)())
+        self.assertIsInstance(self.optimize('def g(): (if 0: yield 1 else: 2)').exprs[0].expr.body, If)
+
+    def test_block_collapsing(self):
+        body = self.optimize('(a; (b; ()); ((c)))')
+        self.assertEquals(['a', 'b', 'c'], [e.var.name for e in body.exprs])
+
+    def test_import_caching(self):
+        body = self.optimize('import os; def f(x): (\n  import math(sqrt), os\n  sqrt(x)\n)\n@memo def g(): (if x: import math(sqrt); 2)')
+        self.assertEquals([SetVariable, SetVariable, Import, SetVariable, SetVariable], [type(e) for e in body.exprs])
+        self.assertEquals(['$import:math:sqrt', '$import:os'], [e.var.name for e in body.exprs[:2]])
+        self.assertFalse(body.exprs[2].cached)
+        self.assertTrue(body.exprs[3].expr.body.exprs[0].cached)
+        self.assertTrue(body.exprs[4].expr.function.body.exprs[0].then_body.cached)
+
+    def test_cached_imports_run_on_call(self):
+        scope = {}
+        f = dojo_compile('def f(x): (import math(sqrt); sqrt(x)); f', optimize=1)(scope)
+        self.assertNotIn('sqrt', scope)
+        self.assertEquals([2.0, 3.0], [f(4), f(9)])
+        self.assertIn('sqrt', scope)
+
+    def assertImportFailsOnCall(self, backend):
+        g = dojo_compile('def g(): (import no_such_dojo_module; 1); g', optimize=1, backend=backend)()
+        self.assertRaises(ImportError, g)
+        self.assertRaises(ImportError, g)
+
+    def test_cached_import_of_missing_module_fails_on_call(self):
+        self.assertImportFailsOnCall('bytecode')
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'the ast backend needs Python 3.8+')
+    def test_cached_import_of_missing_module_fails_on_call_with_ast_backend(self):
+        self.assertImportFailsOnCall('ast')
+
+    def test_disabled_passes(self):
+        body = self.optimize('if 1: 2+3', disabled=('fold', 'deadbranch'))
+        self.assertIsInstance(body.exprs[0], If)
+        self.assertIsInstance(body.exprs[0].then_body, BinaryOp)
+        self.assertIsInstance(self.optimize('2+3', level=0).exprs[0], BinaryOp)
+
+    def test_optimized_programs(self):
+        self.assertEquals([14, True, 1.0, None, 3], dojo_compile('[2+3*4, 1==1, 1.0, if 0: 1, (1;(2;3))]', optimize=1)())
+        self.assertEquals(55, dojo_compile('def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2); fib(10)', optimize=1)())
+
+
+def instructions(code):
+    if hasattr(dis, 'get_instructions'):
+        jumps = set(opcode.hasjrel + opcode.hasjabs)
+        return [(i.opname, i.argval if i.opcode in jumps else i.arg)
+                for i in dis.get_instructions(code) if i.opname != 'RESUME']
+
+    code_bytes = bytearray(code.co_code)
+    result, i = [], 0
+    while i < len(code_bytes):
+        op = opcode.opname[code_bytes[i]]
+        if code_bytes[i] >= opcode.HAVE_ARGUMENT:
+            result.append((op, code_bytes[i+1] | code_bytes[i+2] << 8))
+            i += 3
+        else:
+            result.append((op, None))
+            i += 1
+    return result
+
+def opnames(code):
+    return [op for op, arg in instructions(code)]
+
+class PeepholeTestCase(unittest.TestCase):
+    def test_store_without_dup_and_pop(self):
+        code = dojo_compile('a=1; b=2; a+b', optimize=1).code
+        self.assertEquals(['LOAD_CONST', 'STORE_FAST'] * 2, opnames(code)[:4])
+        self.assertNotIn('POP_TOP', opnames(code))
+        self.assertEquals(3, dojo_compile('a=1; b=2; a+b', optimize=1)())
+
+    def test_unused_constants_are_removed(self):
+        code = dojo_compile('1; "abc"; a', optimize=1, disabled_passes=['blocks']).code
+        self.assertEquals(['LOAD_GLOBAL', 'RETURN_VALUE'], opnames(code))
+
+    def test_jumps_to_jumps_are_retargeted(self):
+        code = dojo_compile('a and b and c', optimize=1).code
+        targets = [arg for op, arg in instructions(code) if 'IF_FALSE' in op]
+        self.assertEquals(2, len(targets))
+        self.assertEquals(targets[0], targets[1])
+        self.assertEquals(0, dojo_compile('a and b and c', optimize=1)({'a': 1, 'b': 0, 'c': 2}))
+
+    def test_jumps_to_return_are_replaced(self):
+        code = dojo_compile('if a: b else: c', optimize=1).code
+        self.assertEquals([], [op for op in opnames(code) if op in UNCONDITIONAL_JUMPS])
+        self.assertEquals(['b', 'c'], [dojo_compile('if a: b else: c', optimize=1)({'a': x, 'b': 'b', 'c': 'c'}) for x in (1, 0)])
+
+    def test_line_numbers_are_kept(self):
+        try:
+            dojo_compile('a = 1\nb = 2\n3\n\na/0', optimize=1, disabled_passes=['fold'])()
+        except ZeroDivisionError:
+            line = traceback.extract_tb(sys.exc_info()[2])[-1][1]
+        self.assertEquals(5, line)
+
+
+class JumpEncodingTestCase(unittest.TestCase):
+    def test_short_jumps_have_no_extended_arg(self):
+        code = dojo_compile('def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2); fib(10)').code
+        fib = [const for const in code.co_consts if isinstance(const, types.CodeType)][0]
+        self.assertNotIn('EXTENDED_ARG', opnames(fib))
+        self.assertEquals(55, dojo_compile('def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2); fib(10)')())
+
+    def test_long_jumps_use_extended_arg(self):
+        source = 'if a: (' + '; '.join(['b'] * 20000) + ') else: c'
+        compiled = dojo_compile(source)
+        self.assertGreater(len(compiled.code.co_code), 0xFFFF)
+        self.assertIn('EXTENDED_ARG', opnames(compiled.code))
+        self.assertEquals(['b', 'c'], [compiled({'a': x, 'b': 'b', 'c': 'c'}) for x in (1, 0)])
+
+    def test_stack_size_covers_large_literals(self):
+        compiled = dojo_compile('[' + ', '.join(map(str, range(3000))) + ']')
+        self.assertGreaterEqual(compiled.code.co_stacksize, 3000)
+        self.assertEquals(list(range(3000)), compiled())
+
+
+class LoopTestCase(unittest.TestCase):
+    def test_for_and_while(self):
+        self.assertEquals(45, dojo_compile('total = 0; for x in range(10): total = total + x; total')())
+        self.assertEquals([0, 1, 4], dojo_compile('i = 0; acc = []\nwhile i < 3: (acc.append(i*i); i = i+1)\nacc')())
+        self.assertEquals(None, dojo_compile('for x in []: 1')())
+
+    def test_loops_in_functions_and_generators(self):
+        source = 'def f(n): (s = 0; for i in range(n): for j in range(i): s = s + j; s); f(10)'
+        self.assertEquals(120, dojo_compile(source)())
+        self.assertEquals(120, dojo_compile(source, optimize=1)())
+        self.assertEquals([2, 4, 6], dojo_compile('def g(xs): for x in xs: yield x*2; list(g([1, 2, 3]))')())
+        self.assertEquals([20, 20, 20], dojo_compile(
+            'fs = []; for i in range(3): fs.append(/=> i*10); fs |> map{f=>f()} |> list')())
+
+    def test_loops_compile_to_bytecode_loops(self):
+        compiled = dojo_compile('def f(n): (i = 0; while i < n: i = i + 1; i); f(1000)')
+        f = [const for const in compiled.code.co_consts if isinstance(const, types.CodeType)][0]
+        self.assertEquals(1000, compiled())
+        self.assertEquals([], [op for op in opnames(f) if op.startswith('CALL')])
+        self.assertIn('FOR_ITER', opnames(dojo_compile('for x in [1]: x').code))
+
+
+class ComprehensionTestCase(unittest.TestCase):
+    def test_list_dict_and_generator_comprehensions(self):
+        self.assertEquals([0, 1, 4, 9], dojo_compile('[x*x for x in range(4)]')())
+        self.assertEquals([5, 7, 9], dojo_compile('[x for x in range(10) if x % 2 if x > 3]', optimize=1)())
+        self.assertEquals({0: '0', 1: '1'}, dojo_compile('{x: str(x) for x in range(2)}')())
+        self.assertEquals([[2, 3, 4], []], dojo_compile('g = (x+1 for x in [1, 2, 3]); [list(g), list(g)]')())
+        self.assertEquals(5050, dojo_compile('sum(x for x in range(101))')())
+
+    def test_nested_clauses_and_comprehensions(self):
+        self.assertEquals([[1, 0], [2, 0], [2, 1]], dojo_compile('[[x, y] for x in range(3) for y in range(x)]')())
+        self.assertEquals([[2, 4], [6]], dojo_compile('[[y*2 for y in row] for row in [[1, 2], [3]]]')())
+        self.assertEquals([20, 20, 20], dojo_compile(
+            'def f(n): [/=> i*n for i in range(3)] |> map{g=>g()} |> list; f(10)')())
+
+    def test_loop_variables_and_assignments_are_local(self):
+        self.assertEquals([99, [0, 1, 2]], dojo_compile('x = 99; ys = [x for x in range(3)]; [x, ys]')())
+        self.assertEquals([2, 4], dojo_compile('[t for x in [1, 2] if (t = x*2)]')())
+        self.assertRaises(NameError, dojo_compile('[(t = x) for x in [1]]; t'))
+        self.assertRaises(NameError, dojo_compile('[x for x in [1] if (u = x)]; u'))
+
+    def test_element_does_not_touch_outer_scopes(self):
+        program = Parser('def f(x): (def g(): [x for x in range(2)]; g())').program()
+        f = program.body.exprs[0].expr
+        g = f.body.exprs[0].expr
+        self.assertEquals(([], []), (f.cell, g.free))
+        self.assertEquals([0, 1], dojo_compile('def f(x): (def g(): [x for x in range(2)]; g()); f(5)')())
+
+    def test_nested_elements_are_parsed_once(self):
+        source = '[' * 30 + 'x' + ' for x in [1]]' * 30
+        parser = Parser(source)
+        parser.program()
+        self.assertEquals(parser.consumed, parser.scans)
+        self.assertEquals([[[1]]], dojo_compile('[' * 3 + 'x' + ' for x in [1]]' * 3)())
+
+    def test_comprehensions_build_inline(self):
+        code = dojo_compile('[str(x) for x in xs if x]').code
+        comprehension = [const for const in code.co_consts if isinstance(const, types.CodeType)][0]
+        self.assertEquals('<listcomp>', comprehension.co_name)
+        self.assertIn('LIST_APPEND', opnames(comprehension))
+        self.assertNotIn('MAP_ADD', opnames(comprehension))
+        self.assertEquals([1, 3], dojo_compile('[x for x in xs if x % 2]', optimize=1)({'xs': [1, 2, 3]}))
+
+
+class TailCallTestCase(unittest.TestCase):
+    def test_deep_tail_recursion(self):
+        source = 'def count(n, acc): if n == 0: acc else: count(n-1, acc+1); count(1000000, 0)'
+        self.assertEquals(1000000, dojo_compile(source, tail_calls=True)())
+        self.assertEquals(1000000, dojo_compile(source, tail_calls=True, optimize=1)())
+        self.assertRaises(RuntimeError, dojo_compile(source))
+
+    def test_deep_tail_recursion_with_return(self):
+        self.assertEquals(500000500000, dojo_compile("""
+            def sum(n, acc): (
+                if n == 0: return acc
+                return sum(n-1, acc+n)
+            )
+            sum(1000000, 0)
+        """, tail_calls=True)())
+
+    def test_tail_calls_in_boolean_ops_and_pipes(self):
+        self.assertEquals(True, dojo_compile('def f(n): n == 0 or f(n-1); f(1000000)', tail_calls=True)())
+        self.assertEquals(0, dojo_compile('def f(n): if n: n-1 |> f else: n; f(1000000)', tail_calls=True)())
+
+    def test_non_tail_calls_are_kept(self):
+        source = 'def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2); fib(10)'
+        self.assertEquals(55, dojo_compile(source, tail_calls=True)())
+        self.assertEquals(6, dojo_compile('def f(n, x): if n: f(n-1) else: x; f(0, 6)', tail_calls=True)())
+
+    def test_functions_that_rebind_their_name_are_not_looped(self):
+        for source in ['def f(n): (f = /x=>99; if n: f(n-1) else: 0); f(3)',
+                       'def f(n): (g = /=> f = /x=>99; g(); if n: f(n-1) else: 0); f(3)']:
+            self.assertEquals(99, dojo_compile(source)())
+            self.assertEquals(99, dojo_compile(source, tail_calls=True)())
+
+    def test_functions_with_cells_and_generators_are_not_looped(self):
+        self.assertEquals(3, dojo_compile('def f(n, g): if n: f(n-1, g or (/=>n)) else: g(); f(3, None)', tail_calls=True)())
+        self.assertEquals(3, dojo_compile('def g(n): (yield n; g(n-1)); list(g(3))', tail_calls=True)()[0])
+
+
+class MemoTestCase(unittest.TestCase):
+    def setUp(self):
+        memo_reset()
+
+    def test_memoized_recursion(self):
+        self.assertEquals(354224848179261915075, dojo_compile("""
+            @memo def fib(n):
+                if n<=2: 1 else: fib(n-1)+fib(n-2)
+            fib(100)
+        """, 'fib.dojo')())
+        self.assertEquals(CacheInfo(97, 100, 0, 128, None), memo_stats()[('fib.dojo', 'fib', 2)])
+
+    def test_bounded_cache_evicts_least_recently_used(self):
+        self.assertEquals([[1, 4, 1, 9, 4], (1, 4, 2, 2, 2)], dojo_compile("""
+            @memo(2) def sq(x): x*x
+            [[sq(1), sq(2), sq(1), sq(3), sq(2)], sq.cache_info()]
+        """)())
+
+    def test_memoized_keyword_arguments(self):
+        self.assertEquals([3, 3, 3, (1, 2, 0, 128, 2)], dojo_compile(
+            '@memo def add(a, b): a+b; [add(1, 2), add(1, @b=2), add(1, 2), add.cache_info()]')())
+
+    def test_memo_requires_def(self):
+        self.assertRaises(UnexpectedToken, dojo_compile, '@memo x=>x')
+        self.assertRaises(UnexpectedToken, dojo_compile, '@cache def f(x): x')
+
+
+class InlineCallTestCase(unittest.TestCase):
+    def runtime_consts(self, code):
+        return [const for const in code.co_consts if const is COMPOSE or const is functools.partial]
+
+    def test_pipe_into_partial_is_a_direct_call(self):
+        source = 'range(1, 20) |> filter{x=>x%2==0} |> list'
+        self.assertEquals([], self.runtime_consts(dojo_compile(source, optimize=1).code))
+        self.assertEquals(list(range(2, 20, 2)), dojo_compile(source, optimize=1)())
+
+    def test_pipe_into_composition_is_a_direct_call(self):
+        scope = {'inc2': lambda a: a+2, 'str': str}
+        self.assertEquals([], self.runtime_consts(dojo_compile('42 |> inc2 :: str', optimize=1).code))
+        self.assertEquals('44', dojo_compile('42 |> inc2 :: str', optimize=1)(scope))
+        self.assertEquals('44', dojo_compile('(inc2 :: str)(42)', optimize=1)(scope))
+        self.assertEquals(['45'], dojo_compile('[42] |> map{inc2 :: (x=>x+1) :: str} |> list', optimize=1)(scope))
+
+    def test_partial_keywords(self):
+        scope = {'f': lambda a, b=1, c=2: [a, b, c]}
+        self.assertEquals([0, 3, 4], dojo_compile('0 |> f{@b=3, @c=4}', optimize=1)(scope))
+        self.assertEquals([0, 3, 5], dojo_compile('f{@b=3, @c=4}(0, @c=5)', optimize=1)(scope))
+
+    def test_bound_variables_are_read_before_later_assignments(self):
+        scope = {'f': lambda a=0, k=0: [a, k], 'g': lambda a: a * 2, 'h': lambda a: a + 1}
+        self.assertEquals([5, 1], dojo_compile('x = 1; f{@k=x}((x = 5))', optimize=1)(dict(scope)))
+        self.assertEquals([1, 1], dojo_compile('x = 1; f{@k=x}(x)', optimize=1)(dict(scope)))
+        self.assertEquals(3, dojo_compile('q = g; ((q = h; g) :: q)(1)', optimize=1)(dict(scope)))
+        self.assertEquals([], self.runtime_consts(dojo_compile('x = 1; f{@k=x}(x)', optimize=1).code))
+
+    def test_function_values_fall_back_to_runtime_objects(self):
+        compiled = dojo_compile('g = inc2 :: str; h = str{}; [g(1), h(2)]', optimize=1)
+        self.assertEquals(2, len(self.runtime_consts(compiled.code)))
+        self.assertEquals(['3', '2'], compiled({'inc2': lambda a: a+2, 'str': str}))
+
+    def test_evaluation_order_is_kept(self):
+        calls = []
+        def make(name):
+            calls.append(name)
+            return lambda x: x + name
+        scope = {'make': make}
+
+        self.assertEquals('xab', dojo_compile('"x" |> make("a") :: make("b")', optimize=1)(scope))
+        self.assertEquals(['a', 'b'], calls)
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'the ast backend needs Python 3.8+')
+class AstBackendTestCase(unittest.TestCase):
+    def assertSameResult(self, source, scope=None):
+        expected = dojo_compile(source)(dict(scope or {}))
+        self.assertEquals(expected, dojo_compile(source, backend='ast')(dict(scope or {})))
+
+    def test_expressions_match_bytecode_backend(self):
+        self.assertSameResult('[2+3*4, 1 < 2, 3 in [3], not 0, -2, "a"[0], {1: 2}, [1, 2, 3][1..]]')
+        self.assertSameResult('[if 1: (z = 3; z+1) else: 0, 0 or (w = 2; w), 1 and (if 0: 2), {1: (q = 5)}]')
+        self.assertSameResult('range(1, 20) |> filter{x=>x%2==0} |> map{str :: len} |> list')
+        self.assertSameResult('import math(sqrt); def f(x): (import math(floor); floor(sqrt(x))); f(10)')
+
+    def test_functions_closures_and_generators(self):
+        self.assertSameResult('adder = /n=>/x=>n=n+x; a = adder(0); [a(1), a(2)]')
+        self.assertSameResult('def g(n): (yield n; yield n+1); list(g(3))')
+        self.assertSameResult('@memo def fib(n): if n<=2: 1 else: fib(n-1)+fib(n-2); fib(50)')
+        self.assertSameResult('def f(a, b): a-b; f(@b=1, @a=3)')
+
+    def test_stop_iteration_inside_generator_matches_bytecode_backend(self):
+        source = 'def g(): (yield 1; next(iter([]))); list(g())'
+        self.assertRaises(RuntimeError, dojo_compile(source))
+        self.assertRaises(RuntimeError, dojo_compile(source, backend='ast'))
+        self.assertSameResult('def g(): (yield 1; next(iter([1]))); list(g())')
+
+    def test_imports_run_once_per_module(self):
+        self.assertSameResult('import math(sqrt, pi), os; [sqrt(4), pi, os.sep]')
+        module = AstGenerator(Parser('import math(sqrt, pi), os').program()).module()
+        imports = [type(node) for node in ast.walk(module) if isinstance(node, (ast.Import, ast.ImportFrom))]
+        self.assertEquals([ast.Import, ast.Import], imports)
+
+    def test_loops(self):
+        self.assertSameResult('t = 0; for x in range(10): t = t + x; [t, x]')
+        self.assertSameResult('i = 0; n = 0; while (i = i + 1; i < 5): n = n + i; n')
+        self.assertSameResult('def f(xs): (ys = []; for x in xs: if x: ys.append(x); ys); f([0, 1, 2])')
+
+    def test_comprehensions(self):
+        self.assertSameResult('[[x, y] for x in range(4) if x for y in range(x) if (z = y; z % 2 == 0)]')
+        self.assertSameResult('g = (x*2 for x in [1, 2]); [{k: str(k) for k in range(3)}, list(g), list(g)]')
+
+    def test_globals_shadowed_by_later_locals(self):
+        self.assertSameResult('f = /=> y; y = 2; [f(), y]', {'y': 1})
+        self.assertSameResult('[a, (a = 1), a]', {'a': 5})
+
+    def test_works_without_a_bytecode_backend(self):
+        original = dojo.backend.BACKEND, dojo.backend.select_backend
+        dojo.backend.BACKEND = None
+        dojo.backend.select_backend = lambda: select_backend((3, 99))
+        try:
+            self.assertEquals(5, dojo_compile('2+3', backend='ast')())
+            self.assertRaises(UnsupportedVersion, dojo_compile, '2+3')
+        finally:
+            dojo.backend.BACKEND, dojo.backend.select_backend = original
+
+    def test_constant_names(self):
+        self.assertSameResult('[None, True, False, not None, (x => None)(1)]')
+        self.assertSameResult('def f(None): (True = None; def g(): True; [None, g()]); [f(1), True]')
+        self.assertRaises(ValueError, compile_code, 'None = 1', '<string>', None, (0, (), False, 'ast'), module=True)
+
+    def test_tail_calls_need_bytecode_backend(self):
+        self.assertRaises(ValueError, dojo_compile, 'def f(n): f(n)', tail_calls=True, backend='ast')
+
+
+class SessionTestCase(unittest.TestCase):
+    def test_definitions_persist_across_chunks(self):
+        session = Session()
+        self.assertEquals([], session.feed('x = 2\n'))
+        self.assertEquals([2], session.flush())
+        session.feed('def f(a): a * x\n')
+        session.flush()
+        self.assertEquals([42, 5], session.feed('f(21); x = 5; f(10)\n'))
+        self.assertEquals([50], session.flush())
+        self.assertEquals(5, session.globals['x'])
+
+    def test_incomplete_input_waits_for_more(self):
+        session = Session()
+        self.assertEquals([1], session.feed('1\n[2,\n'))
+        self.assertTrue(session.pending)
+        self.assertEquals([], session.feed('3]\n'))
+        self.assertTrue(session.pending)
+        self.assertEquals([[2, 3]], session.flush())
+        self.assertFalse(session.pending)
+
+    def test_pipelines_continue_on_next_line(self):
+        session = Session()
+        for line in ['x = [3, 1, 2]\n', '|> sorted\n', '\n', '|> map{str}\n', ':: list\n']:
+            self.assertEquals([], session.feed(line))
+        self.assertEquals([['1', '2', '3']], session.feed('x\n'))
+        self.assertEquals([['1', '2', '3']], session.flush())
+
+        session = Session({'input': lambda prompt: '12', 'print': lambda *args: args})
+        results = []
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples', 'primes.dojo')) as f:
+            for line in f:
+                results += session.feed(line)
+        results += session.flush()
+        self.assertEquals(('The result is:', '2, 3, 5, 7, 11'), results[-1])
+
+    def test_functions_assign_session_variables(self):
+        session = Session()
+        session.feed('counter = 0\ninc = /=>counter = counter + 1\n')
+        session.flush()
+        self.assertEquals([1, 2, 2], session.feed('inc(); inc(); counter\n') + session.flush())
+
+    def test_errors_discard_input_and_keep_line_numbers(self):
+        session = Session()
+        self.assertRaises(UnexpectedToken, session.feed, '1 1\n2\n')
+        self.assertFalse(session.pending)
+        session.feed('\nundefined_name\n')
+        try:
+            session.flush()
+            self.fail('expected NameError')
+        except NameError:
+            self.assertEquals(4, traceback.extract_tb(sys.exc_info()[2])[-1][1])
+        self.assertFalse(session.pending)
+
+def shifted_exprs(program):
+    for chunk in program.body.exprs:
+        outer, chunk = (chunk.delta, chunk.expr) if isinstance(chunk, LineShift) else (0, chunk)
+        for e in chunk.exprs:
+            delta, e = (e.delta, e.expr) if isinstance(e, LineShift) else (0, e)
+            yield outer + delta, e
+
+def absolute(program):
+    exprs = []
+    for delta, e in shifted_exprs(program):
+        e = copy.deepcopy(e)
+        todo = [e]
+        while todo:
+            node = todo.pop()
+            node.line += delta
+            todo.extend(node.children())
+        exprs.append(e)
+    return Program(1, Block(1, exprs), program.cell, program.free)
+
+class IncrementalParserTestCase(unittest.TestCase):
+    SOURCE = 'x = 1\ndef f(a): a + x\ny = f(2)\nz = [y,\n  f(3)]\nw = z |> sum\n'
+
+    def edit(self, parser, old, new, after=''):
+        pos = parser.source.index(old, parser.source.index(after))
+        program = parser.edit(pos, pos + len(old), new)
+        self.assertEquals(Parser(parser.source).program(), absolute(program))
+        return program
+
+    def test_edit_reuses_unchanged_expressions(self):
+        parser = IncrementalParser(self.SOURCE)
+        before = [e for _, e in shifted_exprs(parser.program())]
+        after = [e for _, e in shifted_exprs(self.edit(parser, '2', '40'))]
+        self.assertEquals(1, parser.full_parses)
+        self.assertTrue(all(a is b for a, b in zip(before[:1] + before[3:], after[:1] + after[3:])))
+        self.assertEquals(45, DojoCallable(dojo_emit(parser.program(), '<test>'))())
+
+    def test_edits_shift_line_numbers_of_later_expressions(self):
+        parser = IncrementalParser(self.SOURCE)
+        self.edit(parser, '\n', '\n\n\n', 'y = f')
+        self.edit(parser, ',\n  ', ', ')
+        self.edit(parser, '\n\n', '; 7\n')
+        self.assertEquals(1, parser.full_parses)
+        self.assertEquals(6, absolute(parser.program()).body.exprs[-1].line)
+
+    def test_edits_leave_earlier_programs_untouched(self):
+        parser = IncrementalParser(self.SOURCE)
+        program = parser.program()
+        before = absolute(program)
+        self.edit(parser, '\n', '\n\n\n', 'x = 1')
+        self.edit(parser, 'f(2)', 'f(2) + 1')
+        self.assertEquals(1, parser.full_parses)
+        self.assertEquals(before, absolute(program))
+
+    def test_shifted_expressions_compile_with_their_new_lines(self):
+        parser = IncrementalParser(self.SOURCE + 'g = /=> [y, /=> w]\n')
+        self.edit(parser, '\n', '\n\n', 'x = 1')
+        self.edit(parser, '', '\n', 'w =')
+        self.assertEquals(1, parser.full_parses)
+        for backend in ['bytecode', 'ast'] if sys.version_info >= (3, 8) else ['bytecode']:
+            lines = [[(code.co_name, code.co_firstlineno, list(dis.findlinestarts(code)))
+                      for code in code_objects(BACKENDS[backend](program, '<test>', 0, False))]
+                     for program in (parser.program(), Parser(parser.source).program())]
+            self.assertEquals(lines[1], lines[0])
+
+    def test_new_names_do_not_need_a_full_parse(self):
+        parser = IncrementalParser(self.SOURCE)
+        self.edit(parser, '', 'u = 2; v = /=> u\n', 'y = f')
+        self.assertEquals(1, parser.full_parses)
+        self.edit(parser, 'f(3)', 'u')
+        self.assertEquals(2, parser.full_parses)
+
+    def test_scope_changes_fall_back_to_full_parse(self):
+        parser = IncrementalParser(self.SOURCE)
+        self.edit(parser, 'x = 1\n', '')
+        self.assertEquals(2, parser.full_parses)
+        self.edit(parser, 'a + x', 'a + (/=> a)()')
+        self.assertEquals(3, parser.full_parses)
+
+    def test_syntax_errors_keep_the_edited_source(self):
+        parser = IncrementalParser(self.SOURCE)
+        self.assertRaises(UnexpectedToken, parser.edit, 0, 0, ')')
+        self.assertEquals(')' + self.SOURCE, parser.source)
+        self.edit(parser, ')', '')
+
+
+class CommandLineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.program = os.path.join(self.directory, 'prog.dojo')
+        with open(self.program, 'w') as f:
+            f.write('print(2+3)\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_module(self, args, stdin=''):
+        process = subprocess.Popen([sys.executable, '-m'] + args, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        out, err = process.communicate(stdin)
+        self.assertEquals(0, process.returncode, err)
+        return out
+
+    def test_optimize_flag_before_file(self):
+        self.assertEquals('5\n', self.run_module(['dojo.compiler', '--no-cache', '-O', self.program]))
+        self.assertEquals('5\n', self.run_module(['dojo.compiler', '--no-cache', self.program, '-O']))
+
+    def test_optimize_flag_in_repl(self):
+        self.assertIn('5', self.run_module(['dojo.repl', '-O'], 'print(2+3)\n'))
+
+    def test_optimize_flag_in_benchmarks(self):
+        self.assertIn('fibonacci', self.run_module(['benchmarks.suite', '--repeat', '1', '--scale', '0.05', '-O', 'fib']))
+
+
 class CompilerErrorTestCase(unittest.TestCase):
     def test_exception_contains_line_number_on_different_line(self):
         with self.assertRaises(UnexpectedToken) as context:
             dojo_compile('2+2\n2+3\n  )')
 
         self.assertIn('line 3 column 3', context.exception.args[0])
+        self.assertEquals((3, 3), (context.exception.line, context.exception.column))
 
     def test_exception_contains_line_number_on_same_line(self):
         with self.assertRaises(UnexpectedToken) as context:
@@ -421,6 +1420,7 @@ class CompilerErrorTestCase(unittest.TestCase):
             dojo_compile('$')
 
         self.assertIn('line 1 column 1', context.exception.args[0])
+        self.assertEquals((1, 1), (context.exception.line, context.exception.column))
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)